@@ -10,7 +10,8 @@ class PostAdmin(admin.ModelAdmin):
 
 
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ("title", "slug", "description")
+    list_display = ("title", "slug", "description", "post_count", "last_post_at")
+    readonly_fields = ("post_count", "last_post_at")
     list_filter = ("title", "slug")
     empty_value_display = "-пусто-"
     prepopulated_fields = {"slug": ("title",)}
@@ -0,0 +1,104 @@
+"""
+JSON API лент только для чтения: /api/v1/ повторяет index, group_posts,
+profile и follow_index. Навигация курсорная (?cursor=, ?limit=), ответы
+отдаются с ETag и Last-Modified; если лента не изменилась, клиент получает
+304 без выборки и сериализации постов.
+"""
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+
+from . import conditional
+from .feeds import feed_queryset
+from .models import Group, Post, User
+from .paginator import PER_PAGE, CursorPaginator
+from .timeline import follow_feed
+
+
+API_VERSION = 1
+MAX_LIMIT = 50
+# компактный JSON: без пробелов и \u-экранирования кириллицы
+JSON_PARAMS = {"separators": (",", ":"), "ensure_ascii": False}
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get("limit", PER_PAGE))
+    except ValueError:
+        return PER_PAGE
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def serialize_post(post):
+    data = {
+        "id": post.pk,
+        "author": post.author.username,
+        "group": post.group.slug if post.group_id else None,
+        "text": post.text,
+        "pub_date": post.pub_date,
+        "comments": post.comment_count,
+    }
+    if post.image:
+        data["image"] = post.image.url
+    if post.thumbnail:
+        data["thumbnail"] = default_storage.url(post.thumbnail)
+    return data
+
+
+def _feed_response(request, queryset, scopes, *etag_parts):
+    """ страница ленты в JSON с условной выдачей по ETag/Last-Modified """
+    cursor = request.GET.get("cursor", "")
+    limit = _limit(request)
+
+    def render_page(request):
+        page = CursorPaginator(feed_queryset(queryset), limit).get_page(cursor)
+        data = {
+            "results": [serialize_post(post) for post in page],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        }
+        return JsonResponse(data, json_dumps_params=JSON_PARAMS)
+
+    response = condition(
+        etag_func=lambda request: conditional.etag(
+            scopes, API_VERSION, cursor, limit, *etag_parts
+        ),
+        last_modified_func=lambda request: conditional.last_modified(queryset, scopes),
+    )(render_page)(request)
+    # клиент может хранить ответ, но перед использованием обязан его проверить
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+@require_safe
+def index(request):
+    return _feed_response(request, Post.objects.all(), ["feed"])
+
+
+@require_safe
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed_response(request, group.posts.all(), [f"group:{group.pk}"])
+
+
+@require_safe
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return _feed_response(request, author.posts.all(), [f"author:{author.pk}"])
+
+
+@require_safe
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {"detail": "Требуется авторизация."}, status=401, json_dumps_params=JSON_PARAMS
+        )
+    user = request.user
+    response = _feed_response(
+        request, follow_feed(user), ["feed", f"follow:{user.pk}"], user.pk
+    )
+    patch_vary_headers(response, ["Cookie"])
+    patch_cache_control(response, private=True)
+    return response
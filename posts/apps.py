@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     name = "posts"
+
+    def ready(self):
+        from . import signals  # noqa
+
+        if getattr(settings, "POSTS_TEMPLATE_WARMUP", False):
+            from .warmup import warm_up
+
+            warm_up()
@@ -0,0 +1,93 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def fragment_timeout():
+    """ сколько живут закэшированные фрагменты страниц и карточек """
+    return getattr(settings, "POSTS_FRAGMENT_CACHE_TIMEOUT", 300)
+
+
+def _key(scope):
+    return f"posts:version:{scope}"
+
+
+def _initial():
+    # версия, потерянная кэшем, не должна совпасть с уже выданной раньше
+    return int(time.time() * 1000)
+
+
+def get_versions(*scopes):
+    """ текущие версии содержимого областей ("feed", "group:1", "post:5"...) """
+    keys = {_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, scope in keys.items():
+        if key not in found:
+            cache.add(key, _initial(), None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+    return versions
+
+
+def page_version(*scopes):
+    """ версия страницы ленты, собранная из версий её областей """
+    versions = get_versions(*scopes)
+    return ".".join(str(versions[scope]) for scope in scopes)
+
+
+def _modified_key(scope):
+    return f"posts:modified:{scope}"
+
+
+def bump(*scopes):
+    """ инвалидирует все фрагменты, зависящие от перечисленных областей,
+    и запоминает время изменения для заголовка Last-Modified """
+    for scope in scopes:
+        key = _key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial(), None)
+    now = time.time()
+    cache.set_many({_modified_key(scope): now for scope in scopes}, None)
+
+
+def modified(*scopes):
+    """ время последнего изменения областей (timestamp) или None,
+    если кэш его не помнит """
+    stamps = cache.get_many([_modified_key(scope) for scope in scopes])
+    return max(stamps.values(), default=None)
+
+
+def post_version(post, page=None):
+    """ версия карточки поста; версии всех постов страницы читаются
+    из кэша одним запросом при первой карточке """
+    versions = getattr(page, "post_versions", None)
+    if versions is None or f"post:{post.pk}" not in versions:
+        posts = list(page) if page is not None else []
+        if post not in posts:
+            posts.append(post)
+        versions = get_versions(*(f"post:{item.pk}" for item in posts))
+        if page is not None:
+            page.post_versions = versions
+    return versions[f"post:{post.pk}"]
+
+
+def post_scopes(post_id, author_id, group_id):
+    """ области, которые затрагивает изменение поста или его комментариев """
+    scopes = ["feed", "pages", f"post:{post_id}", f"author:{author_id}"]
+    if group_id is not None:
+        scopes.append(f"group:{group_id}")
+    return scopes
+
+
+def count_scopes(author_id, group_id):
+    """ области состава лент для кэшированного числа записей: сдвигаются,
+    только когда пост появляется, удаляется или меняет группу, но не от
+    правок текста и комментариев """
+    scopes = ["posts", f"posts:author:{author_id}"]
+    if group_id is not None:
+        scopes.append(f"posts:group:{group_id}")
+    return scopes
@@ -0,0 +1,81 @@
+"""
+Условные HTTP-ответы для лент: ETag и Last-Modified считаются без
+выборки постов, поэтому ответ 304 обходится без сериализации и рендеринга.
+
+ETag строится из версий областей кэша фрагментов (posts.cache): версия
+сдвигается при любом изменении поста или комментария, включая правки и
+удаления. Last-Modified — самая поздняя из дат: публикации нового поста
+в ленте и последнего изменения её областей.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.db.models import Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import cache
+
+
+def etag(scopes, *parts):
+    """ сильный ETag ленты: версии её областей и параметры ответа """
+    version = cache.page_version(*scopes)
+    raw = "|".join(str(part) for part in (version, *parts))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def last_modified(queryset, scopes):
+    """ время последнего изменения ленты для заголовка Last-Modified """
+    newest = queryset.order_by().aggregate(newest=Max("pub_date"))["newest"]
+    changed = cache.modified(*scopes)
+    if changed is not None:
+        changed = datetime.fromtimestamp(changed, tz=timezone.utc)
+    dates = [date for date in (newest, changed) if date is not None]
+    return max(dates, default=None)
+
+
+def anonymous_conditional(resolve):
+    """ условная выдача HTML-страницы ленты анонимным посетителям.
+
+    resolve(request, *args, **kwargs) возвращает (queryset, scopes) ленты
+    страницы. Если страница не изменилась, отдаётся 304 без вызова view
+    и рендеринга шаблона; ответ разрешено хранить браузеру и обратному
+    прокси POSTS_ANONYMOUS_MAX_AGE секунд. Страницы авторизованных
+    пользователей и ответы с ожидающими сообщениями отдаются как обычно
+    и помечаются private """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            personal = (
+                request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+                or len(get_messages(request)) > 0
+            )
+            if personal:
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True)
+                return response
+            queryset, scopes = resolve(request, *args, **kwargs)
+            response = condition(
+                etag_func=lambda request, *args, **kwargs: etag(
+                    scopes, request.get_full_path()
+                ),
+                last_modified_func=lambda request, *args, **kwargs: last_modified(
+                    queryset, scopes
+                ),
+            )(view)(request, *args, **kwargs)
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=getattr(settings, "POSTS_ANONYMOUS_MAX_AGE", 60),
+            )
+            patch_vary_headers(response, ["Cookie"])
+            return response
+
+        return wrapper
+
+    return decorator
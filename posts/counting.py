@@ -0,0 +1,99 @@
+"""
+Число записей ленты для постраничной навигации.
+
+Paginator считает записи через COUNT(*), и на главной это полный проход
+по таблице постов на каждый запрос. Стратегия выбирается для каждой
+страницы в POSTS_COUNT_STRATEGIES:
+
+    exact       - обычный COUNT(*);
+    maintained  - счётчик, который поддерживают сигналы (Group.post_count,
+                  ProfileStats.post_count); где его нет - как cached;
+    cached      - COUNT(*) один раз на версию областей состава ленты
+                  (cache.count_scopes): их сдвигают только появление,
+                  удаление и перенос поста в другую группу;
+    estimate    - оценка планировщика (pg_class.reltuples на PostgreSQL,
+                  sqlite_stat1 после ANALYZE на SQLite) для ленты без
+                  фильтров. Небольшие таблицы, меньше
+                  POSTS_COUNT_EXACT_BELOW строк, считаются точно. Если
+                  оценки нет, число берётся как в cached.
+
+Оценка бывает больше настоящего числа: тогда последние страницы пустые.
+"""
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.db import DatabaseError, connection
+
+from . import cache
+
+
+def strategy(view):
+    strategies = getattr(settings, "POSTS_COUNT_STRATEGIES", {})
+    return strategies.get(view, "exact")
+
+
+def exact_below():
+    return getattr(settings, "POSTS_COUNT_EXACT_BELOW", 10000)
+
+
+def _counted():
+    """ курсорная навигация без POSTS_CURSOR_COUNT число записей не выводит """
+    if getattr(settings, "POSTS_PAGINATION_MODE", "offset") == "cursor":
+        return getattr(settings, "POSTS_CURSOR_COUNT", False)
+    return True
+
+
+def feed_count(view, queryset, scopes, maintained=None):
+    """ число записей ленты страницы view или None, если пагинатор
+    должен посчитать их сам. scopes - области кэша, от которых зависит
+    состав ленты; maintained - значение поддерживаемого счётчика, если он есть """
+    name = strategy(view)
+    if name == "exact" or not _counted():
+        return None
+    if name == "maintained" and maintained is not None:
+        return maintained
+    if name == "estimate":
+        estimated = estimate(queryset)
+        if estimated is not None:
+            return estimated if estimated >= exact_below() else None
+    return cached_count(view, queryset, scopes)
+
+
+def cached_count(view, queryset, scopes):
+    """ COUNT(*), сохранённый в кэше до следующего изменения областей """
+    key = f"posts:count:{view}:{'/'.join(scopes)}:{cache.page_version(*scopes)}"
+    count = default_cache.get(key)
+    if count is None:
+        count = queryset.count()
+        default_cache.set(key, count, cache.fragment_timeout())
+    return count
+
+
+def estimate(queryset):
+    """ оценка числа строк таблицы по статистике планировщика или None:
+    для лент с фильтром или из нескольких частей и при отсутствии статистики """
+    query = getattr(queryset, "query", None)
+    if query is None or query.where:
+        return None
+    table = queryset.model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [table],
+                )
+            elif connection.vendor == "sqlite":
+                # первое число stat - строк в таблице на момент ANALYZE
+                cursor.execute(
+                    "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+                    [table],
+                )
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        # sqlite_stat1 появляется только после первого ANALYZE
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
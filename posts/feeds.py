@@ -0,0 +1,100 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Post
+
+
+FEED_ORDERING = ("-pub_date", "-pk")
+
+
+def _comment_count():
+    # коррелированный подзапрос вместо JOIN + GROUP BY: без группировки
+    # сортировку и LIMIT ленты отдаёт индекс (…, -pub_date, -id)
+    comments = (
+        Comment.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(comments, output_field=IntegerField()), 0)
+
+
+class MergedFeed:
+    """ несколько непересекающихся лент постов, слитых при чтении: каждая
+    часть читается своим индексом в порядке ленты, срез страницы
+    собирается слиянием первых записей частей. Поддерживает то, что нужно
+    Paginator, CursorPaginator и условной выдаче """
+
+    def __init__(self, *parts, ordering=FEED_ORDERING):
+        self.parts = parts
+        self.ordering = tuple(ordering)
+
+    @property
+    def model(self):
+        return self.parts[0].model
+
+    def _map(self, method, *args, **kwargs):
+        parts = (getattr(part, method)(*args, **kwargs) for part in self.parts)
+        return MergedFeed(*parts, ordering=self.ordering)
+
+    def filter(self, *args, **kwargs):
+        return self._map("filter", *args, **kwargs)
+
+    def order_by(self, *ordering):
+        merged = self._map("order_by", *ordering)
+        merged.ordering = ordering or self.ordering
+        return merged
+
+    def aggregate(self, **aggregates):
+        """ агрегаты частей сводятся максимумом: ленте нужна только
+        самая поздняя дата публикации (Max) """
+        results = [part.aggregate(**aggregates) for part in self.parts]
+        return {
+            name: max((row[name] for row in results if row[name] is not None), default=None)
+            for name in aggregates
+        }
+
+    def count(self):
+        return sum(part.count() for part in self.parts)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start, stop = index.start or 0, index.stop
+        names = [name.lstrip("-") for name in self.ordering]
+        merged = heapq.merge(
+            *(part if stop is None else part[:stop] for part in self.parts),
+            key=attrgetter(*names),
+            reverse=self.ordering[0].startswith("-"),
+        )
+        return list(islice(merged, start, stop))
+
+
+def feed_queryset(queryset=None):
+    """ посты для вывода карточками: автор и группа подтягиваются join'ом,
+    число комментариев считается в том же запросе. Лента, уже
+    упорядоченная по своему индексу (follow_feed), порядок сохраняет """
+    if queryset is None:
+        queryset = Post.objects.all()
+    if isinstance(queryset, MergedFeed):
+        return MergedFeed(
+            *(feed_queryset(part) for part in queryset.parts),
+            ordering=queryset.ordering,
+        )
+    queryset = queryset.select_related("author", "group").annotate(
+        comment_count=_comment_count()
+    )
+    if queryset.query.order_by:
+        return queryset
+    return queryset.order_by(*FEED_ORDERING)
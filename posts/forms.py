@@ -1,5 +1,11 @@
 from django import forms
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+
+from . import imaging, thumbnails
 from .models import Post, Comment
+from .storage import post_storage
 
 
 class PostForm(forms.ModelForm):
@@ -11,6 +17,60 @@ class PostForm(forms.ModelForm):
             "image",
         )
 
+    def clean_image(self):
+        """ ограничивает размер загрузки, уменьшает и пережимает картинку
+        без EXIF; одинаковые картинки хранятся в одном файле """
+        image = self.cleaned_data.get("image")
+        if not isinstance(image, UploadedFile):
+            return image
+        max_bytes = getattr(settings, "POSTS_IMAGE_MAX_BYTES", 10 * 1024 * 1024)
+        if image.size > max_bytes:
+            raise forms.ValidationError(
+                f"Файл больше {max_bytes // (1024 * 1024)} МБ."
+            )
+        image.seek(0)
+        try:
+            content, ext = imaging.normalize(
+                image,
+                max_side=getattr(settings, "POSTS_IMAGE_MAX_SIDE", 1920),
+                quality=getattr(settings, "POSTS_IMAGE_QUALITY", 85),
+                max_pixels=getattr(settings, "POSTS_IMAGE_MAX_PIXELS", 50_000_000),
+            )
+        except (OSError, ValueError):
+            raise forms.ValidationError(
+                "Не удалось обработать изображение, загрузите другой файл."
+            )
+        upload = ContentFile(content, name=f"image.{ext}")
+        name = post_storage.hashed_name(
+            Post._meta.get_field("image").generate_filename(None, upload.name), upload
+        )
+        if post_storage.reuse(name):
+            return name
+        return upload
+
+    def save(self, commit=True):
+        """ при смене картинки миниатюра делается заново в фоне """
+        image_changed = "image" in self.changed_data
+        if image_changed:
+            self.instance.thumbnail = ""
+            self.instance.image_variants = ""
+            twin = (
+                Post.objects.filter(image=self.instance.image.name)
+                .exclude(image_variants="")
+                .values("thumbnail", "image_variants")
+                .first()
+                if self.instance.image
+                else None
+            )
+            if twin is not None:
+                self.instance.thumbnail = twin["thumbnail"]
+                self.instance.image_variants = twin["image_variants"]
+                image_changed = False
+        post = super().save(commit)
+        if commit and image_changed:
+            thumbnails.schedule(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,92 @@
+"""
+Денормализованные данные групп и кэш групп в памяти процесса.
+
+Group.post_count и Group.last_post_at поддерживаются сигналами постов,
+поэтому странице группы не нужен COUNT(*) для пагинатора. Группа по slug
+берётся из словаря процесса; запись действительна, пока не сдвинулась
+версия области group:<id> в общем кэше, а её сдвигает любое изменение
+группы и её постов.
+"""
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.http import Http404
+
+from . import cache
+from .models import Group, Post
+
+
+# в словаре не больше стольких групп: заброшенные slug'и не копятся вечно
+MAX_CACHED = 1000
+
+_by_slug = {}
+
+
+def _scope(group_id):
+    return f"group:{group_id}"
+
+
+def get_by_slug(slug):
+    """ группа по slug из кэша процесса или из базы; Http404, если нет """
+    entry = _by_slug.get(slug)
+    if entry is not None:
+        version, group = entry
+        if cache.get_versions(_scope(group.pk))[_scope(group.pk)] == version:
+            return group
+    group_id = Group.objects.filter(slug=slug).values_list("pk", flat=True).first()
+    if group_id is None:
+        _by_slug.pop(slug, None)
+        raise Http404("Группа не найдена")
+    # версия читается до выборки: изменение после неё сдвинет версию
+    # и запись просто устареет, а не закэширует старые данные
+    version = cache.get_versions(_scope(group_id))[_scope(group_id)]
+    group = Group.objects.filter(pk=group_id).first()
+    if group is None or group.slug != slug:
+        raise Http404("Группа не найдена")
+    if len(_by_slug) >= MAX_CACHED:
+        _by_slug.clear()
+    _by_slug[slug] = (version, group)
+    return group
+
+
+def forget(slug):
+    """ убирает группу из кэша процесса """
+    _by_slug.pop(slug, None)
+
+
+def post_added(group_id, pub_date):
+    Group.objects.filter(pk=group_id).update(
+        post_count=F("post_count") + 1,
+        last_post_at=Greatest(Coalesce("last_post_at", pub_date), pub_date),
+    )
+
+
+def post_removed(group_id):
+    newest = (
+        Post.objects.filter(group=OuterRef("pk"))
+        .order_by("-pub_date")
+        .values("pub_date")[:1]
+    )
+    Group.objects.filter(pk=group_id).update(
+        post_count=F("post_count") - 1, last_post_at=Subquery(newest)
+    )
+
+
+def recount():
+    """ исправляет счётчики всех групп; возвращает число исправленных """
+    fixed = 0
+    groups = Group.objects.annotate(
+        real_count=Count("posts"), real_last=Max("posts__pub_date")
+    )
+    for group in groups.iterator():
+        if (group.post_count, group.last_post_at) == (group.real_count, group.real_last):
+            continue
+        Group.objects.filter(pk=group.pk).update(
+            post_count=group.real_count, last_post_at=group.real_last
+        )
+        fixed += 1
+    return fixed
+
+
+def directory():
+    """ все группы, сначала те, где писали последними """
+    return Group.objects.order_by(F("last_post_at").desc(nulls_last=True), "title")
@@ -0,0 +1,73 @@
+"""
+Обработка изображений в процессах пула.
+
+Модуль не импортирует django: он загружается в отдельных процессах
+(spawn), которые только читают исходник и пишут результат на диск.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+
+THUMBNAIL_SIZE = (960, 339)
+VARIANT_WIDTHS = (320, 640, 960)
+FORMATS = {
+    "jpg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", {"quality": 60}),
+}
+
+
+def available_formats():
+    """ форматы, которые умеет записывать установленный Pillow """
+    Image.init()
+    return [ext for ext, (fmt, _) in FORMATS.items() if fmt in Image.SAVE]
+
+
+def _save_atomic(image, path, fmt, **params):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp_path, fmt, **params)
+    os.replace(tmp_path, path)
+
+
+def render_variants(source_path, target_base, widths=VARIANT_WIDTHS, size=THUMBNAIL_SIZE):
+    """ кадр карточки в нескольких ширинах и форматах; возвращает
+    метаданные вариантов, чтобы при рендере не обращаться к диску """
+    with Image.open(source_path) as image:
+        image.draft("RGB", (size[0] * 2, size[1] * 2))
+        crop = ImageOps.fit(
+            image.convert("RGB"), size, Image.LANCZOS, centering=(0.5, 0.5)
+        )
+    variants = []
+    for width in sorted(widths):
+        height = round(size[1] * width / size[0])
+        resized = crop if width == size[0] else crop.resize((width, height), Image.LANCZOS)
+        for ext in available_formats():
+            fmt, params = FORMATS[ext]
+            _save_atomic(resized, f"{target_base}-{width}.{ext}", fmt, **params)
+            variants.append({"width": width, "height": height, "format": ext})
+    return variants
+
+
+def normalize(source, max_side, quality, max_pixels):
+    """ уменьшает загруженную картинку до max_side по большей стороне
+    и пережимает её: EXIF и прочие метаданные не сохраняются.
+    Возвращает байты и расширение (jpg или png для картинок с прозрачностью) """
+    with Image.open(source) as image:
+        if image.width * image.height > max_pixels:
+            raise ValueError("слишком большое разрешение")
+        image.draft("RGB", (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if has_alpha:
+        image.save(buffer, "PNG", optimize=True)
+        return buffer.getvalue(), "png"
+    image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue(), "jpg"
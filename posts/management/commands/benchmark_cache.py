@@ -0,0 +1,75 @@
+import multiprocessing
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+
+BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "benchmark"),
+    "sqlite": ("yatube.cache.SQLiteCache", None),
+}
+
+
+def _worker(args):
+    """ один процесс: читает фрагменты, на промахе "рендерит" и кладёт
+    в кэш, иногда сбрасывает версию, как это делают сигналы """
+    backend, location, operations, keys, bump_rate, seed = args
+    cache = import_string(backend)(location, {"OPTIONS": {"MAX_ENTRIES": keys * 4}})
+    rnd = random.Random(seed)
+    payload = "x" * 4096
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(operations):
+        if rnd.random() < bump_rate:
+            try:
+                cache.incr("version")
+            except ValueError:
+                cache.set("version", 1, None)
+            continue
+        version = cache.get("version", 0)
+        key = f"page:{rnd.randrange(keys)}:{version}"
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, payload)
+    return hits, time.perf_counter() - started, cache.get("version", 0)
+
+
+class Command(BaseCommand):
+    help = "Сравнивает LocMemCache и SQLiteCache под нагрузкой из нескольких процессов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--operations", type=int, default=5000)
+        parser.add_argument("--keys", type=int, default=200)
+        parser.add_argument("--bump-rate", type=float, default=0.01)
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        operations = options["operations"]
+        with tempfile.TemporaryDirectory() as directory:
+            for name, (backend, location) in BACKENDS.items():
+                if location is None:
+                    location = f"{directory}/{name}.sqlite3"
+                jobs = [
+                    (backend, location, operations, options["keys"],
+                     options["bump_rate"], seed)
+                    for seed in range(processes)
+                ]
+                started = time.perf_counter()
+                with multiprocessing.Pool(processes) as pool:
+                    results = pool.map(_worker, jobs)
+                elapsed = time.perf_counter() - started
+                hits = sum(result[0] for result in results)
+                versions = {result[2] for result in results}
+                total = processes * operations
+                self.stdout.write(
+                    f"{name:8} {total / elapsed:10.0f} оп/с  "
+                    f"hit rate {hits / total:6.1%}  "
+                    f"версий в процессах: {len(versions)}"
+                )
+        self.stdout.write(f"Текущий бэкенд: {settings.CACHES['default']['BACKEND']}")
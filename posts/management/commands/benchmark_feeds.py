@@ -0,0 +1,166 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post, User
+from posts.workload import power_law
+
+
+VIEWS = ("index", "group_posts", "profile", "post", "follow_index")
+# сколько кандидатов брать для каждой страницы: популярные первыми
+CANDIDATES = 200
+
+
+class Targets:
+    """ адреса страниц, выбираемые с весами по степенному закону:
+    чаще всего открывают первые страницы ленты, популярных авторов,
+    крупные группы и свежие посты """
+
+    def __init__(self, rnd, alpha, pages):
+        self.rnd = rnd
+        self.alpha = alpha
+        self.pages = pages
+        self.authors = list(
+            Post.objects.values_list("author__username", flat=True)
+            .annotate(posts=Count("pk"))
+            .order_by("-posts")[:CANDIDATES]
+        )
+        self.groups = list(
+            Group.objects.order_by("-post_count").values_list("slug", flat=True)[:CANDIDATES]
+        )
+        self.posts = list(
+            Post.objects.order_by("-pub_date", "-pk").values_list(
+                "author__username", "pk"
+            )[:CANDIDATES]
+        )
+        self.readers = list(
+            Follow.objects.values_list("user", flat=True)
+            .annotate(follows=Count("pk"))
+            .order_by("-follows")[:CANDIDATES]
+        )
+
+    def _pick(self, items):
+        return self.rnd.choices(items, cum_weights=power_law(len(items), self.alpha))[0]
+
+    def _page(self):
+        return self._pick(range(1, self.pages + 1))
+
+    def available(self, name):
+        return bool(
+            {
+                "index": True,
+                "group_posts": self.groups,
+                "profile": self.authors,
+                "post": self.posts,
+                "follow_index": self.readers,
+            }[name]
+        )
+
+    def url(self, name):
+        """ адрес и id пользователя, под которым его открывать """
+        if name == "index":
+            return f"{reverse('index')}?page={self._page()}", None
+        if name == "group_posts":
+            slug = self._pick(self.groups)
+            return f"{reverse('group_posts', args=[slug])}?page={self._page()}", None
+        if name == "profile":
+            username = self._pick(self.authors)
+            return f"{reverse('profile', args=[username])}?page={self._page()}", None
+        if name == "post":
+            return reverse("post", args=self._pick(self.posts)), None
+        return f"{reverse('follow_index')}?page={self._page()}", self._pick(self.readers)
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный прогон лент через тестовый клиент: задержка p50/p95/p99, "
+        "запросы к базе на страницу и пропускная способность по каждой странице"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="запросов на страницу")
+        parser.add_argument("--warmup", type=int, default=20, help="запросов на прогрев")
+        parser.add_argument("--views", nargs="+", choices=VIEWS, default=list(VIEWS))
+        parser.add_argument("--pages", type=int, default=5, help="глубина листания лент")
+        parser.add_argument("--alpha", type=float, default=1.1)
+        parser.add_argument(
+            "--cold", action="store_true", help="очищать кэш перед каждым запросом"
+        )
+        parser.add_argument("--json", help="куда сохранить результаты")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            raise CommandError("Нет постов: сначала manage.py generate_data")
+        targets = Targets(
+            random.Random(options["seed"]), options["alpha"], options["pages"]
+        )
+        results = {}
+        for name in options["views"]:
+            if not targets.available(name):
+                self.stdout.write(f"{name}: нет данных, пропущено")
+                continue
+            self._run(targets, name, options["warmup"], options)
+            results[name] = self._summary(
+                self._run(targets, name, options["requests"], options)
+            )
+        self._report(results)
+        if options["json"]:
+            with open(options["json"], "w", encoding="utf-8") as stream:
+                json.dump(results, stream, ensure_ascii=False, indent=2)
+
+    def _run(self, targets, name, count, options):
+        """ задержки в секундах и число запросов к базе по каждому запросу """
+        clients = {None: Client()}
+        samples = []
+        for _ in range(count):
+            url, user_id = targets.url(name)
+            if user_id not in clients:
+                clients[user_id] = Client()
+                clients[user_id].force_login(User.objects.get(pk=user_id))
+            if options["cold"]:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = clients[user_id].get(url)
+                elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f"{url}: ответ {response.status_code}")
+            samples.append((elapsed, len(queries)))
+        return samples
+
+    def _summary(self, samples):
+        latencies = [elapsed for elapsed, _ in samples]
+        queries = [count for _, count in samples]
+        # quantiles требует хотя бы две точки
+        cuts = statistics.quantiles(latencies * 2 if len(latencies) == 1 else latencies, n=100)
+        return {
+            "requests": len(samples),
+            "p50_ms": cuts[49] * 1000,
+            "p95_ms": cuts[94] * 1000,
+            "p99_ms": cuts[98] * 1000,
+            "queries_mean": statistics.mean(queries),
+            "queries_max": max(queries),
+            "rps": len(samples) / sum(latencies),
+        }
+
+    def _report(self, results):
+        self.stdout.write(
+            f"{'страница':14} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} "
+            f"{'запросов':>9} {'макс':>5} {'стр/с':>8}"
+        )
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:14} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} "
+                f"{row['p99_ms']:8.1f} {row['queries_mean']:9.1f} "
+                f"{row['queries_max']:5d} {row['rps']:8.1f}"
+            )
@@ -0,0 +1,90 @@
+import statistics
+import time
+from copy import deepcopy
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory, override_settings
+
+from posts.cache import page_version
+from posts.feeds import feed_queryset
+from posts.warmup import warm_up
+
+
+def _backend(loaders):
+    """ отдельный движок шаблонов с настройками проекта и своими загрузчиками """
+    params = deepcopy(settings.TEMPLATES[0])
+    params.setdefault("NAME", "benchmark")
+    params.setdefault("APP_DIRS", False)
+    del params["BACKEND"]
+    params["OPTIONS"]["loaders"] = loaders
+    return DjangoTemplates(params)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время рендеринга страницы из 10 постов при разборе "
+        "шаблонов на каждый запрос и с кэширующим загрузчиком"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=200)
+        parser.add_argument("--posts", type=int, default=10)
+
+    def handle(self, *args, **options):
+        page = Paginator(feed_queryset(), options["posts"]).get_page(1)
+        if not page.object_list:
+            raise CommandError("Нет постов: сначала manage.py generate_data")
+        # посты выбираются заранее, чтобы замерять только шаблоны
+        page.object_list = list(page.object_list)
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        context = {
+            "page": page,
+            "paginator": page.paginator,
+            "cache_version": page_version("feed"),
+        }
+        plain = settings.TEMPLATE_LOADERS
+        cached = [("django.template.loaders.cached.Loader", plain)]
+        warmed = _backend(cached)
+        count, seconds = warm_up(warmed.engine)
+        self.stdout.write(f"Прогрев: {count} шаблонов за {seconds * 1000:.1f} мс")
+        # с кэшем фрагментов замерялось бы только чтение из кэша
+        fragments = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+        with override_settings(CACHES={**settings.CACHES, "template_fragments": fragments}):
+            for name, backend in (("без прогрева", _backend(cached)), ("после прогрева", warmed)):
+                started = time.perf_counter()
+                backend.get_template("index.html").render(context, request)
+                self.stdout.write(
+                    f"Первый рендеринг {name}: {(time.perf_counter() - started) * 1000:.1f} мс"
+                )
+            results = {
+                "разбор на каждый запрос": self._run(
+                    _backend(plain), request, context, options["renders"]
+                ),
+                "кэширующий загрузчик": self._run(
+                    warmed, request, context, options["renders"]
+                ),
+            }
+        baseline = None
+        for name, timings in results.items():
+            median = statistics.median(timings) * 1000
+            baseline = baseline or median
+            self.stdout.write(
+                f"{name:26} медиана {median:7.2f} мс  "
+                f"p95 {statistics.quantiles(timings, n=20)[-1] * 1000:7.2f} мс  "
+                f"x{baseline / median:.1f}"
+            )
+
+    def _run(self, backend, request, context, renders):
+        # первый рендеринг наполняет кэш загрузчика и в замер не входит
+        backend.get_template("index.html").render(context, request)
+        timings = []
+        for _ in range(renders):
+            started = time.perf_counter()
+            backend.get_template("index.html").render(context, request)
+            timings.append(time.perf_counter() - started)
+        return timings
@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = "Выгружает группы, посты, комментарии или подписки в NDJSON/CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(transfer.SPECS))
+        parser.add_argument(
+            "--output", default="-", help="файл для выгрузки, '-' — stdout"
+        )
+        parser.add_argument("--format", choices=transfer.FORMATS, default=None)
+
+    def handle(self, *args, **options):
+        spec = transfer.SPECS[options["model"]]
+        path = options["output"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        rows = transfer.export_rows(spec)
+        if path == "-":
+            total = transfer.write(spec, rows, sys.stdout, fmt)
+        else:
+            with open(path, "w", encoding="utf-8", newline="") as stream:
+                total = transfer.write(spec, rows, stream, fmt)
+        self.stderr.write(self.style.SUCCESS(f"Выгружено строк: {total}"))
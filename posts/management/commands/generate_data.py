@@ -0,0 +1,179 @@
+import io
+import random
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts import transfer
+from posts.models import Comment, Follow, Group, Post, User
+from posts.storage import post_storage
+from posts.workload import next_number, power_law
+
+
+BATCH_SIZE = 1000
+
+WORDS = (
+    "город лес река море солнце дождь ветер утро вечер ночь книга музыка "
+    "фильм кофе чай дорога поезд самолёт работа отпуск друг семья кот собака "
+    "сад дом окно улица парк зима весна лето осень снег гора поле небо "
+    "новый старый большой тихий яркий тёплый холодный быстрый долгий "
+    "читать писать думать гулять смотреть слушать готовить ехать жить любить"
+).split()
+
+
+def _text(rnd, words):
+    return " ".join(rnd.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _image(rnd, index):
+    """ небольшая картинка с уникальным содержимым """
+    image = Image.new("RGB", (640, 360), tuple(rnd.randrange(256) for _ in range(3)))
+    image.putpixel((index % 640, index // 640 % 360), (index % 256, 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=80)
+    return post_storage.save("posts/generated.jpg", ContentFile(buffer.getvalue()))
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет базу синтетическими пользователями, группами, постами, "
+        "комментариями и подписками; популярность авторов распределена "
+        "по степенному закону"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=20000)
+        parser.add_argument("--comments", type=int, default=50000)
+        parser.add_argument(
+            "--follows", type=int, default=20, help="средняя длина списка подписок"
+        )
+        parser.add_argument(
+            "--alpha",
+            type=float,
+            default=1.1,
+            help="показатель степенного закона: чем больше, тем сильнее "
+            "подписчики и посты сосредоточены у немногих авторов",
+        )
+        parser.add_argument("--images", type=int, default=0, help="сколько постов с картинкой")
+        parser.add_argument("--days", type=int, default=365, help="за сколько дней посты")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options["seed"])
+        now = timezone.now()
+        with transaction.atomic():
+            users = self._users(options["users"])
+            popularity = power_law(len(users), options["alpha"])
+            groups = self._groups(options["groups"])
+            posts = self._posts(rnd, options, users, popularity, groups, now)
+            self._comments(rnd, options["comments"], users, posts, now)
+            self._follows(rnd, options["follows"], users, popularity)
+        self.stdout.write("Пересчёт счётчиков, лент и поискового индекса...")
+        transfer.rebuild(transfer.SPECS)
+        self.stdout.write(self.style.SUCCESS("Готово"))
+        if options["images"]:
+            self.stdout.write(
+                "Варианты картинок делает manage.py generate_thumbnails"
+            )
+
+    def _users(self, count):
+        start = next_number(User.objects.all(), "username", "user")
+        users = []
+        for index in range(start, start + count):
+            user = User(username=f"user{index:06d}", first_name=f"Пользователь {index}")
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        self.stdout.write(f"Пользователей: {count}")
+        names = [user.username for user in users]
+        # порядок важен: первые пользователи самые популярные
+        ids = dict(User.objects.filter(username__in=names).values_list("username", "pk"))
+        return [ids[name] for name in names]
+
+    def _groups(self, count):
+        start = next_number(Group.objects.all(), "slug", "group-")
+        Group.objects.bulk_create(
+            [
+                Group(
+                    title=f"Группа {index}",
+                    slug=f"group-{index}",
+                    description=f"Сгенерированная группа {index}",
+                )
+                for index in range(start, start + count)
+            ]
+        )
+        self.stdout.write(f"Групп: {count}")
+        return list(Group.objects.order_by("-pk").values_list("pk", flat=True)[:count])
+
+    def _posts(self, rnd, options, users, popularity, groups, now):
+        total, days = options["posts"], options["days"]
+        with_image = set(rnd.sample(range(total), min(options["images"], total)))
+        batch = []
+        with transfer.keep_dates(Post):
+            for index in range(total):
+                post = Post(
+                    text=_text(rnd, rnd.randint(5, 60)),
+                    author_id=rnd.choices(users, cum_weights=popularity)[0],
+                    group_id=rnd.choice(groups) if groups and rnd.random() < 0.5 else None,
+                    pub_date=now - timedelta(seconds=rnd.uniform(0, days * 86400)),
+                )
+                if index in with_image:
+                    post.image = _image(rnd, index)
+                batch.append(post)
+                if len(batch) == BATCH_SIZE:
+                    Post.objects.bulk_create(batch)
+                    batch = []
+            Post.objects.bulk_create(batch)
+        self.stdout.write(f"Постов: {total}")
+        return list(
+            Post.objects.order_by("-pk").values_list("pk", "pub_date")[:total]
+        )
+
+    def _comments(self, rnd, total, users, posts, now):
+        if not posts:
+            return
+        batch = []
+        with transfer.keep_dates(Comment):
+            for _ in range(total):
+                post_id, pub_date = rnd.choice(posts)
+                age = (now - pub_date).total_seconds()
+                batch.append(
+                    Comment(
+                        post_id=post_id,
+                        author_id=rnd.choice(users),
+                        text=_text(rnd, rnd.randint(2, 20)),
+                        created=pub_date + timedelta(seconds=rnd.uniform(0, age)),
+                    )
+                )
+                if len(batch) == BATCH_SIZE:
+                    Comment.objects.bulk_create(batch)
+                    batch = []
+            Comment.objects.bulk_create(batch)
+        self.stdout.write(f"Комментариев: {total}")
+
+    def _follows(self, rnd, mean, users, popularity):
+        total = 0
+        batch = []
+        for user in users:
+            wanted = min(int(rnd.expovariate(1 / mean)) if mean else 0, len(users) - 1)
+            authors = set()
+            # выборка с повторами по весам, дубликаты и сам пользователь отбрасываются
+            for _ in range(wanted * 3):
+                if len(authors) >= wanted:
+                    break
+                author = rnd.choices(users, cum_weights=popularity)[0]
+                if author != user:
+                    authors.add(author)
+            batch.extend(Follow(user_id=user, author_id=author) for author in authors)
+            total += len(authors)
+            if len(batch) >= BATCH_SIZE:
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+        self.stdout.write(f"Подписок: {total}")
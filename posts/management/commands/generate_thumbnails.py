@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Делает недостающие миниатюры и варианты картинок постов"
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .filter(image_variants="")
+            .values_list("pk", "image")
+        )
+        done = 0
+        for post_id, image_name in posts.iterator():
+            try:
+                thumbnails.render(post_id, image_name)
+            except OSError as error:
+                self.stderr.write(f"Пост {post_id}: {error}")
+                continue
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f"Обработано картинок: {done}"))
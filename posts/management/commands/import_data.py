@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает группы, посты, комментарии или подписки из NDJSON/CSV "
+        "пачками bulk_create и пересчитывает счётчики, ленты и поиск"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(transfer.SPECS))
+        parser.add_argument("path", help="файл для загрузки, '-' — stdin")
+        parser.add_argument("--format", choices=transfer.FORMATS, default=None)
+        parser.add_argument("--batch-size", type=int, default=transfer.BATCH_SIZE)
+        parser.add_argument(
+            "--ignore-conflicts",
+            action="store_true",
+            help="пропускать строки с уже существующими id",
+        )
+        parser.add_argument(
+            "--no-rebuild",
+            action="store_true",
+            help="не пересчитывать производные данные, например при загрузке "
+            "нескольких файлов подряд: последний запускается без этого флага",
+        )
+
+    def handle(self, *args, **options):
+        name = options["model"]
+        spec = transfer.SPECS[name]
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.endswith(".csv") else "ndjson")
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+        try:
+            total = transfer.load(
+                spec,
+                transfer.read(stream, fmt),
+                batch_size=options["batch_size"],
+                ignore_conflicts=options["ignore_conflicts"],
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(f"Загружено строк: {total}")
+        if not options["no_rebuild"]:
+            transfer.rebuild([name])
+            self.stdout.write("Счётчики, ленты и поисковый индекс пересчитаны")
+        self.stdout.write(self.style.SUCCESS("Готово"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = "Пересобирает материализованные ленты подписок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, default=None, help="id пользователя"
+        )
+
+    def handle(self, *args, **options):
+        timeline.rebuild(options["user"])
+        self.stdout.write(self.style.SUCCESS("Ленты подписок пересобраны"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import groups
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает число записей и дату последней записи групп"
+
+    def handle(self, *args, **options):
+        fixed = groups.recount()
+        self.stdout.write(self.style.SUCCESS(f"Исправлено групп: {fixed}"))
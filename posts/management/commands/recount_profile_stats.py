@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счётчики профилей и исправляет расхождения"
+
+    def handle(self, *args, **options):
+        fixed = stats.recount_all()
+        self.stdout.write(self.style.SUCCESS(f"Исправлено профилей: {fixed}"))
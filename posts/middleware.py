@@ -0,0 +1,125 @@
+"""
+Кэш целых страниц для анонимных читателей.
+
+Запрос без cookie сессии и сообщений до SessionMiddleware, CSRF и ORM не
+доходит: готовый ответ читается из кэша вместе с версией области "pages"
+одним get_many. Любое изменение постов, комментариев, групп и подписок
+сдвигает версию, и все сохранённые страницы разом становятся
+недействительными.
+
+Там же middleware выборочного профилирования запросов (posts.profiling).
+"""
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from . import cache, profiling
+
+
+SCOPE = "pages"
+# страницы, одинаковые для всех анонимных посетителей
+CACHEABLE = {"index", "group_index", "group_posts", "profile", "post"}
+
+
+def _timeout():
+    return getattr(settings, "POSTS_PAGE_CACHE_TIMEOUT", 300)
+
+
+def _key(request):
+    path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+    return f"posts:page:{path}"
+
+
+class AnonymousPageCacheMiddleware:
+    """ ставится сразу после SecurityMiddleware, до SessionMiddleware """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._cacheable_request(request):
+            return self.get_response(request)
+        key = _key(request)
+        version_key = cache._key(SCOPE)
+        found = default_cache.get_many([version_key, key])
+        version = found.get(version_key)
+        if version is None:
+            version = cache.get_versions(SCOPE)[SCOPE]
+        cached = found.get(key)
+        if cached is not None and cached[0] == version:
+            response = cached[1]
+            response["X-Page-Cache"] = "hit"
+            return get_conditional_response(
+                request,
+                etag=response.get("ETag"),
+                last_modified=parse_http_date_safe(response.get("Last-Modified", "")),
+                response=response,
+            )
+        response = self.get_response(request)
+        if request.method == "GET" and self._cacheable_response(request, response):
+            default_cache.set(key, (version, response), _timeout())
+            response["X-Page-Cache"] = "miss"
+        return response
+
+    def _cacheable_request(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return False
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            return False
+        # ожидающие показа сообщения хранятся в cookie
+        if "messages" in request.COOKIES:
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.url_name in CACHEABLE
+
+    def _cacheable_response(self, request, response):
+        if response.status_code != 200 or response.streaming:
+            return False
+        # ответ, ставящий cookie (сессия, CSRF, сообщения), личный
+        if response.cookies:
+            return False
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return False
+        cache_control = response.get("Cache-Control", "")
+        return "private" not in cache_control and "no-store" not in cache_control
+
+
+class ProfilingMiddleware:
+    """ выборочное профилирование (posts.profiling); ставится первым,
+    чтобы в замер попали и ответы из кэша страниц """
+
+    def __init__(self, get_response):
+        if not profiling.enabled():
+            raise MiddlewareNotUsed
+        profiling.install()
+        self.get_response = get_response
+        self.rate = profiling.sample_rate()
+        self.token = profiling.token()
+
+    def __call__(self, request):
+        sampled = random.random() < self.rate or (
+            self.token and request.headers.get("X-Profile") == self.token
+        )
+        if not sampled:
+            return self.get_response(request)
+        return profiling.profile(_view_name, self.get_response, request)
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return "not_found"
+    return match.url_name or match.view_name
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_profilestats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:29
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.HashedFileSystemStorage(), upload_to='posts/', verbose_name='Изображение'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:40
+
+import re
+
+from django.db import migrations
+
+from posts.stemmer import stem
+
+
+WORD = re.compile(r"\w+")
+
+
+def _document(text):
+    return " ".join(stem(word) for word in WORD.findall(text))
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_search USING fts5(text, comments)"
+    )
+    comments = {}
+    for post_id, text in Comment.objects.values_list('post_id', 'text').iterator():
+        comments.setdefault(post_id, []).append(text)
+    with schema_editor.connection.cursor() as cursor:
+        for post_id, text in Post.objects.values_list('pk', 'text').iterator():
+            cursor.execute(
+                "INSERT INTO posts_search (rowid, text, comments) VALUES (%s, %s, %s)",
+                [post_id, _document(text), _document(" ".join(comments.get(post_id, [])))],
+            )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS posts_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
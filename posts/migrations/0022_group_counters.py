@@ -0,0 +1,38 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:42
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def fill_counters(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    groups = Group.objects.annotate(total=Count('posts'), newest=Max('posts__pub_date'))
+    for group in groups.iterator():
+        Group.objects.filter(pk=group.pk).update(
+            post_count=group.total, last_post_at=group.newest
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя запись'),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Записей'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-last_post_at'], name='posts_group_last_po_a493fa_idx'),
+        ),
+    ]
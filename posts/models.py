@@ -1,5 +1,11 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+
+from .storage import post_storage
 
 
 User = get_user_model()
@@ -17,10 +23,23 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name="Описание",
     )
+    # поддерживаются сигналами постов, см. posts.groups
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Записей",
+    )
+    last_post_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name="Последняя запись",
+    )
 
     class Meta:
         verbose_name_plural = "Группы"
         verbose_name = "Группа"
+        indexes = [
+            models.Index(fields=["-last_post_at"]),
+        ]
 
     def __str__(self):
         return self.title
@@ -50,13 +69,50 @@ class Post(models.Model):
         null=True,
     )
     image = models.ImageField(
-        upload_to="posts/", blank=True, null=True, verbose_name="Изображение"
+        upload_to="posts/",
+        storage=post_storage,
+        blank=True,
+        null=True,
+        # по имени ищутся другие посты с тем же файлом
+        db_index=True,
+        verbose_name="Изображение",
+    )
+    thumbnail = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        verbose_name="Миниатюра",
+    )
+    image_variants = models.TextField(
+        blank=True,
+        default="",
+        verbose_name="Варианты изображения",
     )
 
     class Meta:
         verbose_name_plural = "Посты"
         verbose_name = "Пост"
         ordering = ["-pub_date"]
+        # ленты сортируются по (-pub_date, -id), см. feeds.feed_queryset
+        indexes = [
+            models.Index(fields=["author", "-pub_date", "-id"]),
+            models.Index(fields=["group", "-pub_date", "-id"]),
+            models.Index(fields=["-pub_date", "-id"]),
+        ]
+
+    @property
+    def thumbnail_url(self):
+        """ готовая миниатюра или заглушка, пока её делает фоновый воркер """
+        if self.thumbnail:
+            return default_storage.url(self.thumbnail)
+        return static("img/thumbnail-placeholder.svg")
+
+    @property
+    def variants(self):
+        """ метаданные вариантов картинки: ширина, высота, формат, имя """
+        if not self.image_variants:
+            return []
+        return json.loads(self.image_variants)
 
     def __str__(self):
         return (
@@ -90,6 +146,9 @@ class Comment(models.Model):
         verbose_name_plural = "Комментарии"
         verbose_name = "Комментарий"
         ordering = ["-created"]
+        indexes = [
+            models.Index(fields=["post", "-created"]),
+        ]
 
     def __str__(self):
         return (
@@ -114,6 +173,86 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name = "Система подписки"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="posts_follow_user_author_unique"
+            ),
+        ]
 
     def __str__(self):
         return f"Автор: {self.author}, Пользователь: {self.user}"
+
+
+class ProfileStats(models.Model):
+    """ денормализованные счётчики профиля пользователя """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="stats",
+        primary_key=True,
+        verbose_name="Пользователь",
+    )
+    follower_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Подписчиков",
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Подписок",
+    )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Записей",
+    )
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Комментариев",
+    )
+
+    class Meta:
+        verbose_name_plural = "Статистика профилей"
+        verbose_name = "Статистика профиля"
+
+    def __str__(self):
+        return (
+            f"Пользователь: {self.user_id}, "
+            f"Подписчиков: {self.follower_count}, "
+            f"Подписок: {self.following_count}, "
+            f"Записей: {self.post_count}"
+        )
+
+
+class Timeline(models.Model):
+    """ материализованная лента подписок: запись на каждый пост автора,
+    на которого подписан пользователь """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Пользователь",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Пост",
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", verbose_name="Автор"
+    )
+    pub_date = models.DateTimeField(
+        verbose_name="Дата публикации",
+    )
+
+    class Meta:
+        verbose_name_plural = "Ленты подписок"
+        verbose_name = "Запись ленты"
+        ordering = ["-pub_date"]
+        unique_together = ["user", "post"]
+        indexes = [
+            models.Index(fields=["user", "-pub_date", "-post"]),
+            models.Index(fields=["user", "author"]),
+        ]
+
+    def __str__(self):
+        return f"Пользователь: {self.user_id}, Пост: {self.post_id}"
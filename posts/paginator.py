@@ -0,0 +1,230 @@
+import base64
+import json
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+PER_PAGE = 10
+# окно навигации: столько номеров по обе стороны от текущей страницы
+# и столько в начале и в конце, остальное заменяется пропуском (GAP)
+PAGE_WINDOW = 3
+PAGE_ENDS = 2
+GAP = None
+# границы целых значений курсора: числа вне знакового 64-битного
+# диапазона база не сравнивает
+MIN_KEY = -(2 ** 63)
+MAX_KEY = 2 ** 63 - 1
+
+
+class CursorPage(Sequence):
+    """ страница курсорной навигации, совместимая с django Page в шаблонах:
+    вместо номеров соседних страниц отдаются курсоры """
+
+    def __init__(self, object_list, paginator, cursor, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage {self.number or 'first'}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def next_page_number(self):
+        return self.next_cursor
+
+    def previous_page_number(self):
+        return self.previous_cursor
+
+
+class CursorPaginator:
+    """ keyset-пагинация по (pub_date, id): каждая страница читается одним
+    диапазоном индекса без OFFSET, COUNT(*) выполняется только по запросу """
+
+    def __init__(self, object_list, per_page, ordering=("-pub_date", "-pk"), with_count=False):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.with_count = with_count
+
+    @cached_property
+    def count(self):
+        if not self.with_count:
+            return None
+        return self.object_list.count()
+
+    @cached_property
+    def num_pages(self):
+        if self.count is None:
+            return None
+        return max(1, -(-self.count // self.per_page))
+
+    @property
+    def page_range(self):
+        """ номеров страниц у курсоров нет """
+        return range(0)
+
+    def _fields(self):
+        return [(name.lstrip("-"), name.startswith("-")) for name in self.ordering]
+
+    def cursor_after(self, obj):
+        """ курсор страницы, которая начинается сразу после obj """
+        return self._encode(obj, "next")
+
+    def _encode(self, obj, direction):
+        values = [str(getattr(obj, name)) for name, _ in self._fields()]
+        raw = json.dumps([direction] + values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def _decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            direction, *values = json.loads(raw.decode())
+            if len(values) != len(self.ordering):
+                return None
+            opts = self.object_list.model._meta
+            parsed = []
+            for (name, _), value in zip(self._fields(), values):
+                field = opts.pk if name == "pk" else opts.get_field(name)
+                value = None if value is None else field.to_python(value)
+                if value is None:
+                    return None
+                if isinstance(value, int) and not MIN_KEY <= value <= MAX_KEY:
+                    # такое число база не сравнит, а переполнение - не ValueError
+                    return None
+                if isinstance(value, datetime) and timezone.is_naive(value):
+                    value = timezone.make_aware(value, timezone.utc)
+                parsed.append(value)
+        except (TypeError, ValueError, ValidationError):
+            return None
+        if direction not in ("next", "prev"):
+            return None
+        return direction, parsed
+
+    def _after(self, values, reverse):
+        """ условие "строго после курсора" для составного ключа """
+        condition = Q()
+        equal = {}
+        for (name, desc), value in zip(self._fields(), values):
+            lookup = "lt" if desc != reverse else "gt"
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def get_page(self, cursor=None):
+        """ возвращает страницу; неверный курсор даёт первую страницу """
+        decoded = self._decode(cursor) if cursor else None
+        ordering = self.ordering
+        queryset = self.object_list
+        reverse = decoded is not None and decoded[0] == "prev"
+        if reverse:
+            ordering = tuple(
+                name[1:] if name.startswith("-") else f"-{name}" for name in ordering
+            )
+        if decoded is not None:
+            queryset = queryset.filter(self._after(decoded[1], reverse))
+        items = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[: self.per_page]
+        if reverse:
+            items.reverse()
+        has_next = has_more if not reverse else True
+        has_previous = decoded is not None and (has_more if reverse else True)
+        return CursorPage(
+            items,
+            self,
+            cursor if decoded is not None else None,
+            self.cursor_after(items[-1]) if has_next and items else None,
+            self._encode(items[0], "prev") if has_previous and items else None,
+        )
+
+
+def page_window(number, num_pages, on_each_side=PAGE_WINDOW, on_ends=PAGE_ENDS):
+    """ номера страниц для навигации: первые и последние, соседи текущей
+    и GAP на месте пропущенных. Полный range страниц не перебирается,
+    так что число ссылок не зависит от числа страниц. У курсорной
+    навигации номеров нет: окно пустое """
+    if num_pages is None or not isinstance(number, int):
+        return
+    if num_pages <= (on_each_side + on_ends) * 2:
+        yield from range(1, num_pages + 1)
+        return
+    if number > on_each_side + on_ends + 2:
+        yield from range(1, on_ends + 1)
+        yield GAP
+        yield from range(number - on_each_side, number + 1)
+    else:
+        yield from range(1, number + 1)
+    if number < num_pages - on_each_side - on_ends - 1:
+        yield from range(number + 1, number + on_each_side + 1)
+        yield GAP
+        yield from range(num_pages - on_ends + 1, num_pages + 1)
+    else:
+        yield from range(number + 1, num_pages + 1)
+
+
+def paginate(request, queryset, per_page=PER_PAGE, count=None):
+    """ постраничная навигация ленты в режиме из настроек
+    POSTS_PAGINATION_MODE: "offset" или "cursor". Если число записей
+    уже известно (count), COUNT(*) не выполняется """
+    page_number = request.GET.get("page")
+    if getattr(settings, "POSTS_PAGINATION_MODE", "offset") == "cursor":
+        paginator = CursorPaginator(
+            queryset,
+            per_page,
+            with_count=getattr(settings, "POSTS_CURSOR_COUNT", False),
+        )
+    else:
+        paginator = Paginator(queryset, per_page)
+    if count is not None:
+        # count у обоих пагинаторов cached_property: значение кладётся
+        # прямо в экземпляр
+        paginator.count = count
+    return paginator, paginator.get_page(page_number)
+
+
+def comment_paginator(post):
+    """ курсорная навигация по комментариям поста, новые первыми """
+    return CursorPaginator(
+        post.comments.select_related("author"),
+        getattr(settings, "POSTS_COMMENTS_PER_PAGE", 20),
+        ordering=("-created", "-pk"),
+    )
+
+
+def first_comments(post):
+    """ самые новые комментарии поста и курсор следующей порции.
+    Комментарии остаются QuerySet'ом: шаблон и тесты работают с ним как
+    с post.comments.all(). Есть ли продолжение, видно по аннотации
+    comment_count, лишний запрос не нужен """
+    paginator = comment_paginator(post)
+    comments = paginator.object_list.order_by(*paginator.ordering)[: paginator.per_page]
+    total = getattr(post, "comment_count", None)
+    if total is None:
+        total = post.comments.count()
+    cursor = None
+    if total > paginator.per_page:
+        cursor = paginator.cursor_after(list(comments)[-1])
+    return comments, cursor
@@ -0,0 +1,364 @@
+"""
+Выборочное профилирование запросов.
+
+Для каждого отобранного запроса считаются полное время ответа, число и
+время SQL-запросов, время рендеринга шаблонов, попадания и промахи кэша.
+Итоги копятся по страницам внутри процесса и раз в
+POSTS_PROFILING_FLUSH_INTERVAL секунд сбрасываются в общий кэш, откуда
+их собирают служебные страницы в JSON и в текстовом формате Prometheus.
+
+Время рендеринга раскладывается по шаблонам: страница, её шаблон,
+родительские и включённые шаблоны образуют стек, SQL-запросы
+приписываются шаблону, внутри которого выполнились. Стеки отдаются в
+свёрнутом формате для flamegraph.pl и speedscope.
+
+Запрос отбирается с вероятностью POSTS_PROFILING_SAMPLE_RATE или по
+заголовку X-Profile со значением POSTS_PROFILING_TOKEN. Если выключено
+и то и другое, middleware не подключается вовсе и ничего не стоит.
+"""
+import os
+import socket
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache, caches
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+from django.template.base import Template
+
+
+KEY_PREFIX = "posts:profiling"
+REGISTRY_KEY = f"{KEY_PREFIX}:processes"
+# снимки умерших процессов со временем вытесняются
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+# границы корзин гистограммы времени ответа, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+COUNTERS = (
+    "requests",
+    "seconds",
+    "sql_queries",
+    "sql_seconds",
+    "template_seconds",
+    "cache_hits",
+    "cache_misses",
+)
+
+_local = threading.local()
+_lock = threading.Lock()
+_totals = {}
+# свёрнутые стеки "страница;шаблон;включение" -> [секунды, SQL-запросы]
+_stacks = {}
+_flushed_at = time.monotonic()
+_installed = False
+
+
+def sample_rate():
+    return getattr(settings, "POSTS_PROFILING_SAMPLE_RATE", 0.0)
+
+
+def token():
+    return getattr(settings, "POSTS_PROFILING_TOKEN", "")
+
+
+def flush_interval():
+    return getattr(settings, "POSTS_PROFILING_FLUSH_INTERVAL", 10)
+
+
+def enabled():
+    return bool(sample_rate() or token())
+
+
+def _active():
+    return getattr(_local, "record", None)
+
+
+def _frame(template):
+    """ имя шаблона как кадр стека; ";" разделяет кадры в свёрнутом формате """
+    return (template.name or "<string>").replace(";", ":")
+
+
+def _add_stack(stacks, stack, seconds, queries):
+    totals = stacks.setdefault(stack, [0.0, 0])
+    totals[0] += seconds
+    totals[1] += queries
+
+
+def _traced_render(render):
+    """ обёртка Template._render: через неё проходят и включаемые шаблоны,
+    и родительские шаблоны {% extends %}. Каждому шаблону засчитывается
+    собственное время без вложенных шаблонов и SQL-запросов """
+
+    @wraps(render)
+    def wrapper(self, context):
+        record = _active()
+        if record is None:
+            return render(self, context)
+        record["path"].append(_frame(self))
+        record["children"].append(0.0)
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = record["children"].pop()
+            _add_stack(record["stacks"], ";".join(record["path"]), elapsed - children, 0)
+            record["path"].pop()
+            record["children"][-1] += elapsed
+            if not record["path"]:
+                record["template_seconds"] += elapsed
+
+    return wrapper
+
+
+def _counted_get(get):
+    missing = object()
+
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, missing, version)
+        record = _active()
+        if record is not None:
+            record["cache_hits" if value is not missing else "cache_misses"] += 1
+        return default if value is missing else value
+
+    return wrapper
+
+
+def _counted_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        found = get_many(self, keys, version)
+        record = _active()
+        if record is not None:
+            keys = list(keys)
+            record["cache_hits"] += len(found)
+            record["cache_misses"] += len(keys) - len(found)
+        return found
+
+    return wrapper
+
+
+def install():
+    """ оборачивает рендеринг шаблонов и чтение кэша; вне отобранных
+    запросов обёртки сразу передают вызов дальше """
+    global _installed
+    if _installed:
+        return
+    Template._render = _traced_render(Template._render)
+    backend = type(caches["default"])
+    backend.get = _counted_get(backend.get)
+    backend.get_many = _counted_get_many(backend.get_many)
+    _installed = True
+
+
+class _Recorder:
+    """ execute_wrapper соединения: считает SQL-запросы и их время и
+    относит их к шаблону, при рендеринге которого они выполнились, так
+    что ленивые QuerySet, вычисленные в шаблоне, видны в его стеке """
+
+    def __init__(self, record):
+        self.record = record
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            record = self.record
+            record["sql_queries"] += 1
+            record["sql_seconds"] += elapsed
+            _add_stack(record["stacks"], ";".join([*record["path"], "SQL"]), elapsed, 1)
+            record["children"][-1] += elapsed
+
+
+def profile(view, get_response, request):
+    """ выполняет запрос с замерами и добавляет их к итогам страницы """
+    record = dict.fromkeys(COUNTERS, 0)
+    # стек шаблонов, время вложенных кадров на каждом уровне (нулевой
+    # уровень - сама страница) и собственное время по свёрнутым стекам
+    record.update(path=[], children=[0.0], stacks={})
+    _local.record = record
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(_Recorder(record)):
+            response = get_response(request)
+    finally:
+        record["seconds"] = time.perf_counter() - started
+        _local.record = None
+    record["requests"] = 1
+    name = view(request)
+    _add_stack(record["stacks"], "", record["seconds"] - record["children"][0], 0)
+    with _lock:
+        for stack, (seconds, queries) in record["stacks"].items():
+            _add_stack(_stacks, f"{name};{stack}" if stack else name, seconds, queries)
+        totals = _totals.setdefault(name, _empty())
+        for counter in COUNTERS:
+            totals[counter] += record[counter]
+        for index, bound in enumerate(BUCKETS):
+            if record["seconds"] <= bound:
+                totals["buckets"][index] += 1
+    if time.monotonic() - _flushed_at >= flush_interval():
+        flush()
+    return response
+
+
+def _empty():
+    totals = dict.fromkeys(COUNTERS, 0)
+    totals["buckets"] = [0] * len(BUCKETS)
+    return totals
+
+
+def _snapshot_key():
+    return f"{KEY_PREFIX}:{socket.gethostname()}:{os.getpid()}"
+
+
+def flush():
+    """ кладёт итоги процесса в общий кэш; итоги накопительные, поэтому
+    потерянный сброс восполнится следующим """
+    global _flushed_at
+    _flushed_at = time.monotonic()
+    with _lock:
+        snapshot = {
+            "views": {
+                name: {**totals, "buckets": list(totals["buckets"])}
+                for name, totals in _totals.items()
+            },
+            "stacks": {stack: list(totals) for stack, totals in _stacks.items()},
+        }
+    if not snapshot["views"]:
+        return
+    key = _snapshot_key()
+    cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    # список процессов читается и пишется без блокировки: ключ, потерянный
+    # в гонке, вернётся при следующем сбросе этого процесса
+    registry = cache.get(REGISTRY_KEY, set())
+    if key not in registry:
+        cache.set(REGISTRY_KEY, registry | {key}, None)
+
+
+def _snapshots():
+    flush()
+    registry = cache.get(REGISTRY_KEY, set())
+    snapshots = cache.get_many(list(registry))
+    if len(snapshots) < len(registry):
+        cache.set(REGISTRY_KEY, set(snapshots), None)
+    return snapshots.values()
+
+
+def collect():
+    """ итоги всех процессов, сложенные по страницам """
+    merged = {}
+    for snapshot in _snapshots():
+        for name, totals in snapshot["views"].items():
+            target = merged.setdefault(name, _empty())
+            for counter in COUNTERS:
+                target[counter] += totals[counter]
+            for index, count in enumerate(totals["buckets"]):
+                target["buckets"][index] += count
+    return dict(sorted(merged.items()))
+
+
+def collect_stacks():
+    """ свёрнутые стеки всех процессов """
+    merged = {}
+    for snapshot in _snapshots():
+        for stack, (seconds, queries) in snapshot["stacks"].items():
+            _add_stack(merged, stack, seconds, queries)
+    return dict(sorted(merged.items()))
+
+
+def reset():
+    """ забывает итоги этого процесса и всех остальных """
+    with _lock:
+        _totals.clear()
+        _stacks.clear()
+    registry = cache.get(REGISTRY_KEY, set())
+    cache.delete_many([*registry, REGISTRY_KEY])
+
+
+def _per_request(totals, counter, scale=1):
+    return round(totals[counter] * scale / totals["requests"], 3) if totals["requests"] else 0
+
+
+@staff_member_required
+def stats_json(request):
+    result = {}
+    for name, totals in collect().items():
+        lookups = totals["cache_hits"] + totals["cache_misses"]
+        result[name] = {
+            "requests": totals["requests"],
+            "mean_ms": _per_request(totals, "seconds", 1000),
+            "sql_queries_per_request": _per_request(totals, "sql_queries"),
+            "sql_ms_per_request": _per_request(totals, "sql_seconds", 1000),
+            "template_ms_per_request": _per_request(totals, "template_seconds", 1000),
+            "cache_hit_rate": round(totals["cache_hits"] / lookups, 3) if lookups else None,
+            "totals": totals,
+            "buckets": list(BUCKETS),
+        }
+    response = JsonResponse(result, json_dumps_params={"ensure_ascii": False})
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+METRICS = (
+    ("sql_queries", "posts_sql_queries_total", "counter", "SQL-запросы"),
+    ("sql_seconds", "posts_sql_seconds_total", "counter", "Время SQL-запросов"),
+    ("template_seconds", "posts_template_seconds_total", "counter", "Время рендеринга шаблонов"),
+    ("cache_hits", "posts_cache_hits_total", "counter", "Попадания в кэш"),
+    ("cache_misses", "posts_cache_misses_total", "counter", "Промахи кэша"),
+)
+
+
+def prometheus(stats):
+    """ итоги в текстовом формате Prometheus """
+    histogram = "posts_request_duration_seconds"
+    lines = [
+        f"# HELP {histogram} Время ответа отобранных запросов",
+        f"# TYPE {histogram} histogram",
+    ]
+    for name, totals in stats.items():
+        for bound, count in zip(BUCKETS, totals["buckets"]):
+            lines.append(f'{histogram}_bucket{{view="{name}",le="{bound}"}} {count}')
+        lines.append(f'{histogram}_bucket{{view="{name}",le="+Inf"}} {totals["requests"]}')
+        lines.append(f'{histogram}_sum{{view="{name}"}} {totals["seconds"]}')
+        lines.append(f'{histogram}_count{{view="{name}"}} {totals["requests"]}')
+    for counter, metric, kind, description in METRICS:
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, totals in stats.items():
+            lines.append(f'{metric}{{view="{name}"}} {totals[counter]}')
+    return "\n".join(lines) + "\n"
+
+
+@staff_member_required
+def stats_prometheus(request):
+    response = HttpResponse(
+        prometheus(collect()), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def folded(stacks, metric="time"):
+    """ стеки в свёрнутом формате flamegraph.pl и speedscope: строка на
+    стек, значение - микросекунды собственного времени или число запросов """
+    lines = []
+    for stack, (seconds, queries) in stacks.items():
+        value = queries if metric == "queries" else round(seconds * 1_000_000)
+        if value > 0:
+            lines.append(f"{stack} {value}")
+    return "\n".join(lines) + "\n"
+
+
+@staff_member_required
+def stats_folded(request):
+    metric = "queries" if request.GET.get("metric") == "queries" else "time"
+    response = HttpResponse(
+        folded(collect_stacks(), metric), content_type="text/plain; charset=utf-8"
+    )
+    response["Cache-Control"] = "private, no-store"
+    return response
@@ -0,0 +1,248 @@
+"""
+Полнотекстовый поиск по постам и комментариям.
+
+На SQLite используется инвертированный индекс FTS5: таблица posts_search
+хранит для каждого поста (rowid = id поста) основы слов его текста и
+комментариев, результаты ранжируются по bm25. Основы слов считает
+posts.stemmer, поэтому таблица обходится стандартным токенайзером.
+Изменение поста или комментария правит только свою часть документа:
+основы остальных комментариев не пересчитываются.
+
+Поддерживается поиск на SQLite. На PostgreSQL работает только запасной
+вариант: tsvector текста поста с русской конфигурацией считается при
+каждом запросе, без хранимого вектора и GIN-индекса, и комментарии в
+поиске не участвуют.
+"""
+import re
+from collections import Counter
+from itertools import groupby, islice
+from operator import itemgetter
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .feeds import feed_queryset
+from .models import Comment, Post
+from .stemmer import stem
+
+
+TABLE = "posts_search"
+# вес совпадения в тексте поста и в комментариях к нему для bm25
+TEXT_WEIGHT = 1.0
+COMMENTS_WEIGHT = 0.3
+# лишние слова запроса только замедляют поиск
+MAX_TERMS = 8
+BATCH_SIZE = 500
+
+WORD = re.compile(r"\w+")
+
+
+def _uses_fts():
+    return connection.vendor == "sqlite"
+
+
+def terms(text):
+    """ основы слов текста в порядке появления """
+    return [stem(word) for word in WORD.findall(text)]
+
+
+def _document(text):
+    return " ".join(terms(text))
+
+
+def _match_expression(query):
+    """ запрос FTS5: все основы обязательны, последняя ищется как префикс,
+    чтобы находилось недописанное слово. Префиксный поиск заметно дороже
+    точного, поэтому для остальных основ он не используется """
+    words = [f'"{word}"' for word in dict.fromkeys(terms(query))][:MAX_TERMS]
+    words[-1] += "*"
+    return " ".join(words)
+
+
+def _documents(posts, comments):
+    """ строки индекса (rowid, text, comments) из потоков постов и
+    комментариев, упорядоченных по id поста: потоки сливаются на ходу,
+    в памяти только комментарии текущего поста """
+    grouped = groupby(comments, key=itemgetter(0))
+    current = next(grouped, None)
+    for post_id, text in posts:
+        texts = []
+        while current is not None and current[0] <= post_id:
+            if current[0] == post_id:
+                texts = [comment for _, comment in current[1]]
+            current = next(grouped, None)
+        yield [post_id, _document(text), _document(" ".join(texts))]
+
+
+def _stream(posts, comments):
+    posts = posts.order_by("pk").values_list("pk", "text")
+    comments = comments.order_by("post_id", "pk").values_list("post_id", "text")
+    return _documents(posts.iterator(), comments.iterator())
+
+
+def index_posts(post_ids):
+    """ строит записи индекса постов заново по их тексту и всем
+    комментариям; пачка постов индексируется двумя запросами """
+    if not _uses_fts():
+        return
+    post_ids = list(post_ids)
+    rows = list(
+        _stream(
+            Post.objects.filter(pk__in=post_ids),
+            Comment.objects.filter(post_id__in=post_ids),
+        )
+    )
+    with connection.cursor() as cursor:
+        _insert(cursor, rows)
+    for post_id in set(post_ids) - {row[0] for row in rows}:
+        remove_post(post_id)
+
+
+def _stored(cursor, post_id):
+    """ документы поста в индексе: (text, comments) или None """
+    cursor.execute(f"SELECT text, comments FROM {TABLE} WHERE rowid = %s", [post_id])
+    return cursor.fetchone()
+
+
+def _without(document, removed):
+    """ документ без одного вхождения каждой основы removed: для bm25 и
+    поиска по отдельным словам порядок основ не важен """
+    left = Counter(removed.split())
+    words = []
+    for word in document.split():
+        if left[word]:
+            left[word] -= 1
+        else:
+            words.append(word)
+    return " ".join(words)
+
+
+def index_post(post_id, text):
+    """ обновляет текст поста в индексе; документ комментариев берётся
+    из индекса как есть, сами комментарии не перечитываются """
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        stored = _stored(cursor, post_id)
+        if stored is not None:
+            cursor.execute(
+                f"UPDATE {TABLE} SET text = %s WHERE rowid = %s", [_document(text), post_id]
+            )
+            return
+    index_posts([post_id])
+
+
+def index_comment(post_id, old_text=None, new_text=None):
+    """ правит документ комментариев поста на разницу одного комментария:
+    основы старого текста убираются, основы нового добавляются. Стеммер
+    обрабатывает только этот комментарий """
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        stored = _stored(cursor, post_id)
+        if stored is not None:
+            comments = stored[1]
+            if old_text is not None:
+                comments = _without(comments, _document(old_text))
+            if new_text is not None:
+                comments = f"{comments} {_document(new_text)}".strip()
+            cursor.execute(
+                f"UPDATE {TABLE} SET comments = %s WHERE rowid = %s", [comments, post_id]
+            )
+            return
+    index_posts([post_id])
+
+
+def remove_post(post_id):
+    if not _uses_fts():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [post_id])
+
+
+def rebuild():
+    """ строит индекс заново по всем постам; возвращает их число """
+    if not _uses_fts():
+        return 0
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        rows = _stream(Post.objects.all(), Comment.objects.all())
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                break
+            total += _insert(cursor, batch)
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
+
+
+def _insert(cursor, rows):
+    if rows:
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {TABLE} (rowid, text, comments) VALUES (%s, %s, %s)",
+            rows,
+        )
+    return len(rows)
+
+
+class SearchResults:
+    """ результаты поиска FTS5 для Paginator: число совпадений и срез
+    страницы считаются отдельными запросами к индексу """
+
+    def __init__(self, expression):
+        self.expression = expression
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {TABLE} WHERE {TABLE} MATCH %s",
+                [self.expression],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+        start = index.start or 0
+        limit = -1 if index.stop is None else max(0, index.stop - start)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s "
+                f"ORDER BY bm25({TABLE}, %s, %s), rowid DESC LIMIT %s OFFSET %s",
+                [self.expression, TEXT_WEIGHT, COMMENTS_WEIGHT, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = feed_queryset(Post.objects.filter(pk__in=ids)).in_bulk()
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def _postgres_search(query):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+    vector = SearchVector("text", config="russian")
+    search_query = SearchQuery(query, config="russian")
+    return (
+        feed_queryset()
+        .annotate(rank=SearchRank(vector, search_query))
+        .filter(rank__gt=0)
+        .order_by("-rank", "-pub_date", "-pk")
+    )
+
+
+def search_posts(query):
+    """ посты по запросу, самые релевантные первыми; пригодно для Paginator """
+    if not WORD.search(query):
+        return Post.objects.none()
+    if _uses_fts():
+        return SearchResults(_match_expression(query))
+    if connection.vendor == "postgresql":
+        return _postgres_search(query)
+    condition = Q()
+    for word in WORD.findall(query)[:MAX_TERMS]:
+        condition &= Q(text__icontains=word)
+    return feed_queryset(Post.objects.filter(condition))
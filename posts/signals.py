@@ -0,0 +1,208 @@
+import json
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache, groups, search, stats, storage, timeline
+from .models import Comment, Follow, Group, Post, ProfileStats, User
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    """ у нового пользователя сразу есть строка со счётчиками """
+    if created and not raw:
+        ProfileStats.objects.get_or_create(user=instance)
+
+
+def _post_changed(post):
+    scopes = cache.post_scopes(post.pk, post.author_id, post.group_id)
+    old_group_id = getattr(post, "_old_group_id", None)
+    if old_group_id is not None and old_group_id != post.group_id:
+        scopes.append(f"group:{old_group_id}")
+    cache.bump(*scopes)
+
+
+def _comment_changed(comment):
+    post = (
+        Post.objects.filter(pk=comment.post_id)
+        .values("author_id", "group_id")
+        .first()
+    )
+    if post is not None:
+        cache.bump(*cache.post_scopes(comment.post_id, **post))
+
+
+def _group_scopes(group, cards):
+    """ области группы: её страница, а с cards - и карточки её постов во
+    всех лентах, где выводятся название и slug группы """
+    scopes = {"pages", f"group:{group.pk}"}
+    if cards:
+        scopes.add("feed")
+        posts = Post.objects.filter(group_id=group.pk).values_list("pk", "author_id")
+        for post_id, author_id in posts.iterator():
+            scopes.update((f"post:{post_id}", f"author:{author_id}"))
+    return scopes
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, raw=False, **kwargs):
+    """ запоминает прежние название и slug: они выводятся в карточках постов """
+    if instance.pk is None or raw:
+        return
+    old = Group.objects.filter(pk=instance.pk).values_list("title", "slug").first()
+    if old is not None:
+        instance._old_card = old
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    """ после удаления посты группы уже отвязаны: области собираются заранее """
+    instance._deleted_scopes = _group_scopes(instance, cards=True)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    """ название и описание группы выводятся на её странице, название и
+    slug - ещё и в карточках её постов """
+    if raw:
+        return
+    old_card = getattr(instance, "_old_card", None)
+    changed = old_card is not None and old_card != (instance.title, instance.slug)
+    cache.bump(*_group_scopes(instance, cards=changed))
+    groups.forget(instance.slug)
+    if old_card is not None:
+        groups.forget(old_card[1])
+        del instance._old_card
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    cache.bump(*instance._deleted_scopes)
+    groups.forget(instance.slug)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, raw=False, **kwargs):
+    """ запоминает прежние группу и картинку: сбросить кэш страниц
+    старой группы и освободить файл старой картинки """
+    if instance.pk is None or raw:
+        return
+    old = (
+        Post.objects.filter(pk=instance.pk)
+        .values("group_id", "image", "image_variants")
+        .first()
+    )
+    if old is not None:
+        instance._old_group_id = old["group_id"]
+        if old["image"] != instance.image.name:
+            instance._old_image = (old["image"], old["image_variants"])
+
+
+def _release_image(image_name, image_variants):
+    variants = json.loads(image_variants) if image_variants else []
+    transaction.on_commit(partial(storage.release, image_name, variants))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """ сбрасывает кэш ленты; новый пост попадает в ленты подписчиков """
+    if raw:
+        return
+    # счётчики групп меняются до сброса версий: иначе кэш групп успел бы
+    # запомнить старые значения под новой версией
+    old_group_id = None if created else getattr(instance, "_old_group_id", None)
+    if old_group_id != instance.group_id:
+        if old_group_id is not None:
+            groups.post_removed(old_group_id)
+            cache.bump(f"posts:group:{old_group_id}")
+        if instance.group_id is not None:
+            groups.post_added(instance.group_id, instance.pub_date)
+    if created or old_group_id != instance.group_id:
+        cache.bump(*cache.count_scopes(instance.author_id, instance.group_id))
+    _post_changed(instance)
+    search.index_post(instance.pk, instance.text)
+    old_image = getattr(instance, "_old_image", None)
+    if old_image is not None:
+        _release_image(*old_image)
+        del instance._old_image
+    if created:
+        stats.bump(instance.author_id, post_count=1)
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, post_count=-1)
+    if instance.group_id is not None:
+        groups.post_removed(instance.group_id)
+    cache.bump(*cache.count_scopes(instance.author_id, instance.group_id))
+    _post_changed(instance)
+    search.remove_post(instance.pk)
+    if instance.image:
+        _release_image(instance.image.name, instance.image_variants)
+
+
+@receiver(pre_save, sender=Comment)
+def comment_changing(sender, instance, raw=False, **kwargs):
+    """ запоминает прежний текст: его основы убираются из индекса поиска """
+    if instance.pk is None or raw:
+        return
+    instance._old_text = (
+        Comment.objects.filter(pk=instance.pk).values_list("text", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    _comment_changed(instance)
+    old_text = getattr(instance, "_old_text", None)
+    if old_text is not None:
+        del instance._old_text
+    if old_text != instance.text:
+        search.index_comment(instance.post_id, old_text, instance.text)
+    if created:
+        stats.bump(instance.author_id, comment_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    stats.bump(instance.author_id, comment_count=-1)
+    _comment_changed(instance)
+    search.index_comment(instance.post_id, old_text=instance.text)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    """ при подписке в ленту добавляются посты автора """
+    if raw:
+        return
+    cache.bump(
+        "pages",
+        f"follow:{instance.user_id}",
+        f"profile:{instance.user_id}",
+        f"profile:{instance.author_id}",
+    )
+    if created:
+        stats.bump(instance.author_id, follower_count=1)
+        stats.bump(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """ при отписке посты автора убираются из ленты; автор, опустившийся
+    ниже порога популярности, раскладывается по лентам подписчиков """
+    cache.bump(
+        "pages",
+        f"follow:{instance.user_id}",
+        f"profile:{instance.user_id}",
+        f"profile:{instance.author_id}",
+    )
+    stats.bump(instance.author_id, follower_count=-1)
+    stats.bump(instance.user_id, following_count=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.follower_removed(instance.author_id)
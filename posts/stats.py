@@ -0,0 +1,64 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, ProfileStats, User
+
+
+COUNTERS = {
+    "follower_count": (Follow, "author"),
+    "following_count": (Follow, "user"),
+    "post_count": (Post, "author"),
+    "comment_count": (Comment, "author"),
+}
+
+
+def bump(user_id, **deltas):
+    """ атомарно сдвигает счётчики профиля. Если строки ещё нет,
+    она будет посчитана заново при первом обращении к профилю """
+    ProfileStats.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def annotate_counts(users):
+    """ пользователи с честно посчитанными значениями всех счётчиков """
+    annotations = {}
+    for name, (model, field) in COUNTERS.items():
+        counted = (
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(cnt=Count("pk"))
+            .values("cnt")
+        )
+        annotations[f"real_{name}"] = Coalesce(
+            Subquery(counted, output_field=IntegerField()), 0
+        )
+    return users.annotate(**annotations)
+
+
+def recount(user):
+    """ пересчитывает и сохраняет счётчики одного пользователя """
+    real = annotate_counts(User.objects.filter(pk=user.pk)).values(
+        *(f"real_{name}" for name in COUNTERS)
+    )[0]
+    stats, _ = ProfileStats.objects.update_or_create(
+        user=user, defaults={name: real[f"real_{name}"] for name in COUNTERS}
+    )
+    return stats
+
+
+def recount_all():
+    """ исправляет расхождения счётчиков; возвращает число исправленных """
+    fixed = 0
+    users = annotate_counts(User.objects.select_related("stats")).iterator()
+    for user in users:
+        real = {name: getattr(user, f"real_{name}") for name in COUNTERS}
+        stats = getattr(user, "stats", None)
+        if stats is not None and all(
+            getattr(stats, name) == value for name, value in real.items()
+        ):
+            continue
+        ProfileStats.objects.update_or_create(user=user, defaults=real)
+        fixed += 1
+    return fixed
@@ -0,0 +1,92 @@
+"""
+Стеммер для русского языка по алгоритму Snowball (Портера).
+
+Отрезает окончания, чтобы "книга", "книги" и "книгами" попадали в поиске
+в одну основу "книг". Работает только с кириллицей, остальные слова
+возвращает как есть.
+"""
+import re
+from functools import lru_cache
+
+
+VOWELS = "аеиоуыэюя"
+
+RV = re.compile(rf"^(.*?[{VOWELS}])(.*)$")
+PERFECTIVE_GERUND = re.compile(
+    r"((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$"
+)
+REFLEXIVE = re.compile(r"(с[яь])$")
+ADJECTIVE = re.compile(
+    r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|"
+    r"ую|юю|ая|яя|ою|ею)$"
+)
+PARTICIPLE = re.compile(r"((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$")
+VERB = re.compile(
+    r"((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|"
+    r"ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|"
+    r"((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$"
+)
+NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|"
+    r"ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+I_ENDING = re.compile(r"и$")
+DERIVATIONAL = re.compile(r"ость?$")
+SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+DOUBLE_N = re.compile(r"нн$")
+SOFT_SIGN = re.compile(r"ь$")
+CYRILLIC = re.compile(r"^[а-я]+$")
+
+
+def _region(word, start=0):
+    """ начало области после первой согласной, идущей за гласной """
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _cut(pattern, word):
+    """ отрезанное окончание или None, если шаблон не подошёл """
+    cut = pattern.sub("", word, 1)
+    return cut if cut != word else None
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """ основа слова; регистр не важен, ё считается за е """
+    word = word.lower().replace("ё", "е")
+    if not CYRILLIC.match(word):
+        return word
+    match = RV.match(word)
+    if match is None:
+        return word
+    start, rv = match.groups()
+    # область R2 в координатах rv: только в ней убирается суффикс -ость
+    r2 = _region(word, _region(word)) - len(start)
+    # шаг 1: деепричастие, иначе возвратность и одно из окончаний
+    cut = _cut(PERFECTIVE_GERUND, rv)
+    if cut is not None:
+        rv = cut
+    else:
+        rv = REFLEXIVE.sub("", rv, 1)
+        cut = _cut(ADJECTIVE, rv)
+        if cut is not None:
+            rv = PARTICIPLE.sub("", cut, 1)
+        else:
+            cut = _cut(VERB, rv)
+            rv = cut if cut is not None else NOUN.sub("", rv, 1)
+    # шаг 2
+    rv = I_ENDING.sub("", rv, 1)
+    # шаг 3
+    match = DERIVATIONAL.search(rv)
+    if match is not None and match.start() >= r2:
+        rv = rv[: match.start()]
+    # шаг 4
+    cut = _cut(SOFT_SIGN, rv)
+    if cut is not None:
+        rv = cut
+    else:
+        rv = SUPERLATIVE.sub("", rv, 1)
+        rv = DOUBLE_N.sub("н", rv, 1)
+    return start + rv
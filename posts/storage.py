@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import os
+import posixpath
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.deconstruct import deconstructible
+
+
+logger = logging.getLogger(__name__)
+
+
+@deconstructible
+class HashedFileSystemStorage(FileSystemStorage):
+    """ хранилище с адресацией по содержимому: файл называется SHA-256
+    своего содержимого и лежит в подкаталогах ab/cd, как кэш sorl.
+    Одинаковые загрузки попадают в один и тот же файл """
+
+    def hashed_name(self, name, content):
+        """ итоговое имя файла для содержимого content """
+        digest = hashlib.sha256()
+        if hasattr(content, "seek"):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        if hasattr(content, "seek"):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name.replace("\\", "/"))
+        ext = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest[2:4], f"{digest}{ext}")
+
+    def get_available_name(self, name, max_length=None):
+        # имя определяется содержимым, переименовывать нечего
+        return name
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        return super().save(self.hashed_name(name, content), content, max_length)
+
+    def reuse(self, name):
+        """ отмечает использование уже сохранённого файла, если он есть:
+        свежий файл release не удаляет, даже когда ссылок на него в базе
+        ещё нет. Возвращает, нашёлся ли файл """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        if self.reuse(name):
+            return name
+        # пишем во временный файл и атомарно переименовываем: параллельная
+        # загрузка того же содержимого просто перезапишет идентичный файл
+        tmp_name = f"{name}.{uuid.uuid4().hex}.tmp"
+        tmp_name = super()._save(tmp_name, content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
+
+
+post_storage = HashedFileSystemStorage()
+
+
+def release_grace():
+    """ сколько секунд после записи или повторного использования файл
+    не удаляется: столько может пройти от проверки дубликата при загрузке
+    до сохранения ссылающегося на него поста """
+    return getattr(settings, "POSTS_IMAGE_RELEASE_GRACE", 60)
+
+
+def _recently_used(name):
+    try:
+        return time.time() - os.path.getmtime(post_storage.path(name)) < release_grace()
+    except (OSError, SuspiciousFileOperation):
+        return False
+
+
+def release(image_name, variants=()):
+    """ удаляет файл картинки и её варианты, если на них больше не
+    ссылается ни один пост и файл не использовался только что: загрузка
+    того же содержимого могла найти его и ещё не сохранить свой пост """
+    from .models import Post
+
+    if not image_name or Post.objects.filter(image=image_name).exists():
+        return
+    if _recently_used(image_name):
+        logger.info("Файл %s использовался только что и не удаляется", image_name)
+        return
+    files = [(post_storage, image_name)]
+    files += [(default_storage, variant["name"]) for variant in variants]
+    for storage, name in files:
+        try:
+            storage.delete(name)
+        except (OSError, SuspiciousFileOperation) as error:
+            # удаление файла не должно ронять уже закоммиченный запрос
+            logger.warning("Не удалось удалить файл %s: %s", name, error)
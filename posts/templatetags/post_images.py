@@ -0,0 +1,51 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from posts.imaging import THUMBNAIL_SIZE
+
+
+register = template.Library()
+
+MIME_TYPES = {"jpg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+SIZES = "(max-width: 991px) 100vw, 690px"
+SOURCE_ORDER = ("avif", "webp")
+
+
+def _srcset(variants):
+    return ", ".join(
+        f"{default_storage.url(variant['name'])} {variant['width']}w"
+        for variant in variants
+    )
+
+
+@register.simple_tag
+def responsive_image(post, css_class="card-img"):
+    """ <picture> с srcset по всем вариантам картинки поста;
+    пока вариантов нет — заглушка """
+    width, height = THUMBNAIL_SIZE
+    variants = post.variants
+    if not variants:
+        return format_html(
+            '<img class="{}" src="{}" width="{}" height="{}" alt="" />',
+            css_class, post.thumbnail_url, width, height,
+        )
+    by_format = {}
+    for variant in variants:
+        by_format.setdefault(variant["format"], []).append(variant)
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}" />',
+        (
+            (MIME_TYPES[fmt], _srcset(by_format[fmt]), SIZES)
+            for fmt in SOURCE_ORDER
+            if fmt in by_format
+        ),
+    )
+    fallback = by_format.get("jpg", variants)
+    return format_html(
+        '<picture>{}<img class="{}" src="{}" srcset="{}" sizes="{}" '
+        'width="{}" height="{}" loading="lazy" alt="" /></picture>',
+        sources, css_class, post.thumbnail_url, _srcset(fallback), SIZES,
+        width, height,
+    )
@@ -0,0 +1,17 @@
+from django import template
+
+from posts import cache
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def fragment_timeout():
+    return cache.fragment_timeout()
+
+
+@register.simple_tag(takes_context=True)
+def post_version(context, post):
+    """ версия для ключа кэша карточки поста """
+    return cache.post_version(post, context.get("page"))
@@ -0,0 +1,12 @@
+from django import template
+
+from posts.paginator import page_window
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def page_numbers(page):
+    """ номера страниц вокруг текущей, None на месте пропуска """
+    return list(page_window(page.number, page.paginator.num_pages))
@@ -0,0 +1,117 @@
+"""
+Бюджеты запросов к базе и времени ответа для страниц.
+
+Бюджеты лежат в budgets.json рядом с тестами: для каждой страницы
+наибольшее допустимое число SQL-запросов и время ответа в миллисекундах.
+Замер идёт на холодном кэше, иначе фрагменты и кэш страниц спрячут N+1.
+При превышении тест падает с отчётом: какая страница, насколько вышла
+за бюджет и все её запросы, с пометкой повторяющихся.
+
+Пересчитать бюджеты после осознанного изменения:
+    POSTS_UPDATE_BUDGETS=1 python manage.py test posts.tests.test_budgets
+Время на медленной машине можно растянуть множителем
+POSTS_BUDGET_TIME_FACTOR, число запросов от машины не зависит.
+"""
+import json
+import os
+import re
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), "budgets.json")
+# сколько раз открывать страницу: время берётся лучшее, оно меньше шумит
+RUNS = 3
+# запас к измеренному времени при пересчёте бюджетов
+TIME_SLACK = 3
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def _shape(sql):
+    """ запрос без литералов: одинаковые формы подряд и есть N+1 """
+    return LITERAL.sub("?", sql)
+
+
+def load_budgets(path=BUDGETS_PATH):
+    try:
+        with open(path, encoding="utf-8") as stream:
+            return json.load(stream)
+    except FileNotFoundError:
+        return {}
+
+
+def report(name, budget, queries, elapsed_ms):
+    """ текст отчёта о превышении бюджета """
+    shapes = Counter(_shape(query["sql"]) for query in queries)
+    lines = [
+        f"Страница {name!r} вышла за бюджет: "
+        f"запросов {len(queries)} при бюджете {budget['queries']}, "
+        f"{elapsed_ms:.1f} мс при бюджете {budget['ms']} мс",
+    ]
+    repeated = [(count, shape) for shape, count in shapes.items() if count > 1]
+    for count, shape in sorted(repeated, reverse=True):
+        lines.append(f"  повторяется {count} раз: {shape}")
+    lines.append("Запросы:")
+    for number, query in enumerate(queries, 1):
+        lines.append(f"  {number:3}. {query['sql']}")
+    return "\n".join(lines)
+
+
+class QueryBudgetMixin:
+    """ примесь к TestCase: assertWithinBudget открывает страницу и
+    сравнивает число запросов и время с бюджетом из budgets.json """
+
+    budgets_path = BUDGETS_PATH
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.budgets = load_budgets(cls.budgets_path)
+        cls.measured = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.environ.get("POSTS_UPDATE_BUDGETS") and cls.measured:
+            budgets = load_budgets(cls.budgets_path)
+            budgets.update(cls.measured)
+            with open(cls.budgets_path, "w", encoding="utf-8") as stream:
+                json.dump(dict(sorted(budgets.items())), stream, indent=2)
+                stream.write("\n")
+        super().tearDownClass()
+
+    def measure(self, url, client=None):
+        """ запросы последнего прогона и лучшее время в миллисекундах """
+        client = client or self.client
+        best = None
+        for _ in range(RUNS):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.get(url)
+                elapsed = (time.perf_counter() - started) * 1000
+            self.assertEqual(response.status_code, 200, url)
+            best = elapsed if best is None else min(best, elapsed)
+        return queries.captured_queries, best
+
+    def assertWithinBudget(self, name, url, client=None):
+        queries, elapsed_ms = self.measure(url, client)
+        if os.environ.get("POSTS_UPDATE_BUDGETS"):
+            self.measured[name] = {
+                "queries": len(queries),
+                "ms": max(100, int(round(elapsed_ms * TIME_SLACK, -1))),
+            }
+            return
+        budget = self.budgets.get(name)
+        if budget is None:
+            self.fail(
+                f"Для страницы {name!r} нет бюджета в {self.budgets_path}: "
+                f"запустите тесты с POSTS_UPDATE_BUDGETS=1"
+            )
+        factor = float(os.environ.get("POSTS_BUDGET_TIME_FACTOR", 1))
+        if len(queries) > budget["queries"] or elapsed_ms > budget["ms"] * factor:
+            self.fail(report(name, budget, queries, elapsed_ms))
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+
+User = get_user_model()
+
+
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="api_author")
+        cls.reader = User.objects.create_user(username="api_reader")
+        cls.group = Group.objects.create(title="Группа", slug="api-group")
+        for i in range(12):
+            Post.objects.create(text=f"Пост {i}", author=cls.author, group=cls.group)
+        cls.client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_with_cursor(self):
+        """ ленты отдаются страницами с курсором следующей """
+        for url in (
+            reverse("api_index"),
+            reverse("api_group_posts", args=[self.group.slug]),
+            reverse("api_profile", args=[self.author]),
+        ):
+            data = self.client.get(url).json()
+            self.assertEqual(len(data["results"]), 10)
+            self.assertEqual(data["results"][0]["author"], "api_author")
+            self.assertEqual(data["results"][0]["group"], "api-group")
+            rest = self.client.get(url, {"cursor": data["next"]}).json()
+            self.assertEqual(len(rest["results"]), 2)
+            self.assertIsNone(rest["next"])
+
+    def test_not_modified(self):
+        """ неизменившаяся лента даёт 304 без выборки постов,
+        новый комментарий меняет ETag """
+        url = reverse("api_group_posts", args=[self.group.slug])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertLessEqual(len(queries), 2)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=self.client.get(url)["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+        post = Post.objects.filter(group=self.group).first()
+        Comment.objects.create(post=post, author=self.reader, text="Комментарий")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_follow_requires_login(self):
+        url = reverse("api_follow_index")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        client = Client()
+        client.force_login(self.reader)
+        self.assertEqual(client.get(url).json()["results"], [])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(len(client.get(url).json()["results"]), 10)
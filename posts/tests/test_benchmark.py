@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.models import Comment, Follow, Group, Post, Timeline, User
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class GenerateDataTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_generates_consistent_data(self):
+        """ объёмы совпадают с заданными, подписки уникальны и не на себя,
+        комментарии не старше своих постов, ленты подписок заполнены """
+        call_command(
+            "generate_data",
+            users=30, groups=3, posts=200, comments=300, follows=5, seed=1,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        follows = list(Follow.objects.values_list("user", "author"))
+        self.assertTrue(follows)
+        self.assertEqual(len(follows), len(set(follows)))
+        self.assertFalse(any(user == author for user, author in follows))
+        for comment in Comment.objects.select_related("post"):
+            self.assertGreaterEqual(comment.created, comment.post.pub_date)
+        self.assertTrue(Timeline.objects.exists())
+        # степенной закон: у самого плодовитого автора заметно больше постов,
+        # чем в среднем
+        top = max(User.objects.values_list("stats__post_count", flat=True))
+        self.assertGreater(top, 3 * 200 / 30)
+
+    def test_repeated_run_after_deletion(self):
+        """ повторный запуск после удаления строк не повторяет имена """
+        options = dict(users=3, groups=2, posts=5, comments=0, follows=1, stdout=StringIO())
+        call_command("generate_data", seed=4, **options)
+        User.objects.order_by("pk").first().delete()
+        Group.objects.order_by("pk").first().delete()
+        call_command("generate_data", seed=5, **options)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertTrue(User.objects.filter(username="user000005").exists())
+
+    def test_benchmark_reports_every_view(self):
+        call_command(
+            "generate_data",
+            users=10, groups=2, posts=30, comments=20, follows=3, seed=2,
+            stdout=StringIO(),
+        )
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        call_command(
+            "benchmark_feeds", requests=3, warmup=1, seed=2, json=path, stdout=StringIO()
+        )
+        with open(path, encoding="utf-8") as stream:
+            results = json.load(stream)
+        self.assertEqual(
+            set(results), {"index", "group_posts", "profile", "post", "follow_index"}
+        )
+        for row in results.values():
+            self.assertEqual(row["requests"], 3)
+            self.assertLessEqual(row["p50_ms"], row["p99_ms"])
+
+    def test_template_benchmark(self):
+        call_command(
+            "generate_data", users=3, groups=1, posts=10, comments=0, seed=3,
+            stdout=StringIO(),
+        )
+        out = StringIO()
+        call_command("benchmark_templates", renders=3, stdout=out)
+        self.assertIn("кэширующий загрузчик", out.getvalue())
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+from .budgets import QueryBudgetMixin, _shape, report
+
+
+User = get_user_model()
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """ страницы с несколькими авторами, группами и комментариями:
+    N+1 в карточке поста или профиле сразу выводит за бюджет """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username="budget_reader")
+        authors = [User.objects.create_user(username=f"budget_author{i}") for i in range(3)]
+        groups = [
+            Group.objects.create(title=f"Группа {i}", slug=f"budget-{i}", description="О")
+            for i in range(2)
+        ]
+        for i in range(15):
+            post = Post.objects.create(
+                text=f"Пост про котов {i}", author=authors[i % 3], group=groups[i % 2]
+            )
+            for j in range(2):
+                Comment.objects.create(post=post, author=authors[j], text=f"Кот {j}")
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        cls.author = authors[0]
+        cls.group = groups[0]
+        cls.post = post
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_anonymous_pages(self):
+        pages = {
+            "index": reverse("index"),
+            "group_index": reverse("group_index"),
+            "group_posts": reverse("group_posts", args=[self.group.slug]),
+            "profile": reverse("profile", args=[self.author.username]),
+            "post": reverse("post", args=[self.post.author.username, self.post.pk]),
+            "post_comments": reverse(
+                "post_comments", args=[self.post.author.username, self.post.pk]
+            ),
+            "search": reverse("search") + "?q=кот",
+            "api_index": reverse("api_index"),
+            "api_group_posts": reverse("api_group_posts", args=[self.group.slug]),
+            "api_profile": reverse("api_profile", args=[self.author.username]),
+        }
+        for name, url in pages.items():
+            with self.subTest(name):
+                self.assertWithinBudget(name, url)
+
+    def test_reader_pages(self):
+        pages = {
+            "index:reader": reverse("index"),
+            "profile:reader": reverse("profile", args=[self.author.username]),
+            "post:reader": reverse("post", args=[self.post.author.username, self.post.pk]),
+            "follow_index": reverse("follow_index"),
+            "api_follow_index": reverse("api_follow_index"),
+        }
+        for name, url in pages.items():
+            with self.subTest(name):
+                self.assertWithinBudget(name, url, self.reader_client)
+
+
+class BudgetReportTest(TestCase):
+    def test_report_marks_repeated_queries(self):
+        """ отчёт называет страницу и показывает повторяющуюся форму запроса """
+        queries = [
+            {"sql": 'SELECT "name" FROM "auth_user" WHERE "id" = 1'},
+            {"sql": 'SELECT "name" FROM "auth_user" WHERE "id" = 2'},
+            {"sql": "SELECT COUNT(*) FROM \"posts_post\" WHERE \"text\" = 'x'"},
+        ]
+        text = report("profile", {"queries": 2, "ms": 10}, queries, 12.5)
+        self.assertIn("'profile'", text)
+        self.assertIn("запросов 3 при бюджете 2", text)
+        self.assertIn(f"повторяется 2 раз: {_shape(queries[0]['sql'])}", text)
+        self.assertIn(queries[2]["sql"], text)
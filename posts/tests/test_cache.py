@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from yatube.cache import SQLiteCache
+
+
+def _bump(path):
+    cache = SQLiteCache(path, {})
+    for _ in range(50):
+        cache.incr("version")
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sqlite3")
+        self.cache = SQLiteCache(self.path, {"OPTIONS": {"MAX_ENTRIES": 10}})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_basic_operations(self):
+        """ set/get/add/delete/get_many работают как у встроенных бэкендов """
+        self.cache.set("a", {"x": 1})
+        self.assertEqual(self.cache.get("a"), {"x": 1})
+        self.assertFalse(self.cache.add("a", 2))
+        self.assertTrue(self.cache.add("b", 2))
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"a": {"x": 1}, "b": 2})
+        self.cache.delete("a")
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.set("expired", 1, timeout=-1)
+        self.assertFalse(self.cache.has_key("expired"))
+
+    def test_version_bump(self):
+        """ incr_version переносит значение на новую версию ключа """
+        self.cache.set("key", "value")
+        self.assertEqual(self.cache.incr_version("key"), 2)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertEqual(self.cache.get("key", version=2), "value")
+
+    def test_lru_eviction(self):
+        """ при переполнении вытесняются давно не читанные записи """
+        self.cache._access_resolution = 0
+        for i in range(10):
+            self.cache.set(f"key{i}", i)
+        self.cache.get("key0")
+        self.cache.set("key10", 10)
+        self.assertEqual(self.cache.get("key0"), 0)
+        self.assertIsNone(self.cache.get("key1"))
+
+    def test_size_cap(self):
+        """ суммарный размер значений не превышает MAX_SIZE """
+        cache = SQLiteCache(self.path, {"OPTIONS": {"MAX_SIZE": 10000}})
+        for i in range(20):
+            cache.set(f"big{i}", "x" * 1000)
+        size = cache._db.execute("SELECT sum(size) FROM cache").fetchone()[0]
+        self.assertLessEqual(size, 10000)
+        self.assertIsNotNone(cache.get("big19"))
+
+    def test_incr_is_shared_between_processes(self):
+        """ приращения из разных процессов не теряются """
+        self.cache.set("version", 0, None)
+        processes = [
+            multiprocessing.Process(target=_bump, args=(self.path,)) for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.cache.get("version"), 200)
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.models import Post
+from posts.templatetags.post_images import responsive_image
+
+
+User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_file(name="image.jpg", size=(1200, 800), fmt="JPEG", color="red", **params):
+    buffer = BytesIO()
+    Image.new("RGB", size, color).save(buffer, fmt, **params)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, POSTS_THUMBNAILS_ASYNC=False)
+class PostFormImageTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="form_author")
+
+    def test_thumbnail_made_after_save(self):
+        """ после сохранения формы у поста появляется миниатюра 960x339 """
+        form = PostForm(
+            data={"text": "Пост с картинкой"}, files={"image": image_file()}
+        )
+        self.assertTrue(form.is_valid())
+        form.instance.author = self.user
+        post = form.save()
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail)
+        with default_storage.open(post.thumbnail) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (960, 339))
+        formats = {variant["format"] for variant in post.variants}
+        self.assertTrue({"jpg", "webp"} <= formats)
+        for variant in post.variants:
+            self.assertTrue(default_storage.exists(variant["name"]))
+
+    def test_responsive_markup(self):
+        """ шаблонный тег выводит srcset по вариантам картинки """
+        form = PostForm(
+            data={"text": "Пост с картинкой"}, files={"image": image_file()}
+        )
+        self.assertTrue(form.is_valid())
+        form.instance.author = self.user
+        post = Post.objects.get(pk=form.save().pk)
+        html = responsive_image(post)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn("320w", html)
+        self.assertIn("960w", html)
+
+    def test_placeholder_until_ready(self):
+        """ пока миниатюры нет, карточка показывает заглушку """
+        post = Post.objects.create(text="Пост", author=self.user, image="posts/x.jpg")
+        self.assertIn("thumbnail-placeholder", post.thumbnail_url)
+
+    def save_post(self, image):
+        form = PostForm(data={"text": "Пост с картинкой"}, files={"image": image})
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.author = self.user
+        return form.save()
+
+    def test_upload_downscaled_without_exif(self):
+        """ большая картинка уменьшается, EXIF не сохраняется """
+        exif = Image.Exif()
+        exif[0x010F] = "Camera"
+        post = self.save_post(image_file(size=(4000, 1000), exif=exif.tobytes()))
+        with default_storage.open(post.image.name) as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (1920, 480))
+            self.assertNotIn("exif", image.info)
+
+    def test_duplicate_upload_stored_once(self):
+        """ одинаковые картинки хранятся в одном файле """
+        first = self.save_post(image_file(name="one.jpg", color="blue"))
+        second = self.save_post(image_file(name="two.jpg", color="blue"))
+        self.assertEqual(first.image.name, second.image.name)
+        second.refresh_from_db()
+        self.assertTrue(second.image_variants)
+
+    @override_settings(POSTS_IMAGE_RELEASE_GRACE=0)
+    def test_shared_file_deleted_with_last_post(self):
+        """ файл лежит в шардированном каталоге и удаляется только
+        вместе с последним ссылающимся на него постом """
+        first = self.save_post(image_file(name="one.jpg", color="green"))
+        second = self.save_post(image_file(name="two.jpg", color="green"))
+        name = first.image.name
+        self.assertRegex(name, r"^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        first.refresh_from_db()
+        variants = [variant["name"] for variant in first.variants]
+        self.assertTrue(variants)
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.assertFalse(default_storage.exists(name))
+        for variant in variants:
+            self.assertFalse(default_storage.exists(variant))
+
+    def test_recently_used_file_kept(self):
+        """ файл, который только что нашла как дубликат новая загрузка,
+        не удаляется вместе с последним ссылавшимся постом """
+        post = self.save_post(image_file(name="one.jpg", color="white"))
+        path = default_storage.path(post.image.name)
+        os.utime(path, (0, 0))
+        PostForm(data={"text": "Пост"}, files={"image": image_file(color="white")}).is_valid()
+        self.assertGreater(os.path.getmtime(path), 0)
+        post.delete()
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    @override_settings(POSTS_IMAGE_MAX_BYTES=100)
+    def test_upload_size_limit(self):
+        """ слишком большой файл не принимается """
+        form = PostForm(data={"text": "Пост"}, files={"image": image_file()})
+        self.assertFalse(form.is_valid())
+        self.assertIn("image", form.errors)
+
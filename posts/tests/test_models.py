@@ -0,0 +1,212 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+
+from posts import groups
+from posts.feeds import feed_queryset
+from posts.models import Group, Post, Comment, Follow, ProfileStats, Timeline
+from posts.stats import recount_all
+from posts.timeline import follow_feed, rebuild
+
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="author")
+        cls.old_post = Post.objects.create(text="Старый пост", author=cls.author)
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """ подписка добавляет старые посты в ленту, отписка убирает """
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(follow_feed(self.reader)), [self.old_post])
+        follow.delete()
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+
+    def test_new_post_fans_out(self):
+        """ новый пост попадает в ленту подписчика """
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="Новый пост", author=self.author)
+        self.assertEqual(list(follow_feed(self.reader)), [post, self.old_post])
+        post.delete()
+        self.assertEqual(list(follow_feed(self.reader)), [self.old_post])
+
+    @override_settings(POSTS_FANOUT_MAX_FOLLOWERS=0)
+    def test_celebrity_read_on_demand(self):
+        """ посты популярного автора подмешиваются при чтении """
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="Новый пост", author=self.author)
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+        self.assertEqual(list(follow_feed(self.reader)), [post, self.old_post])
+
+    @override_settings(POSTS_FANOUT_MAX_FOLLOWERS=1)
+    def test_celebrity_posts_merged_into_timeline(self):
+        """ посты популярного автора встают между постами из ленты по дате """
+        celebrity = User.objects.create_user(username="celebrity")
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=celebrity)
+        Follow.objects.create(user=self.author, author=celebrity)
+        middle = Post.objects.create(text="Пост популярного автора", author=celebrity)
+        newest = Post.objects.create(text="Новый пост", author=self.author)
+        feed = feed_queryset(follow_feed(self.reader))
+        self.assertEqual(feed.count(), 3)
+        self.assertEqual(list(feed), [newest, middle, self.old_post])
+        self.assertEqual(feed[1:3], [middle, self.old_post])
+
+    @override_settings(POSTS_FANOUT_MAX_FOLLOWERS=1)
+    def test_demoted_celebrity_fans_out_missed_posts(self):
+        """ посты, опубликованные, пока автор был популярным, остаются
+        в ленте после того, как подписчиков стало меньше порога """
+        other = User.objects.create_user(username="other_reader")
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text="Пост популярного автора", author=self.author)
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+        follow.delete()
+        self.assertEqual(list(follow_feed(self.reader)), [post, self.old_post])
+        self.assertTrue(Timeline.objects.filter(user=self.reader, post=post).exists())
+
+    def test_rebuild_restores_timeline(self):
+        """ пересборка возвращает ленту к тому, что поддерживают сигналы """
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        expected = set(Timeline.objects.values_list("user", "post", "author", "pub_date"))
+        Timeline.objects.all().delete()
+        rebuild(self.reader.pk)
+        rebuild()
+        self.assertEqual(
+            set(Timeline.objects.values_list("user", "post", "author", "pub_date")), expected
+        )
+
+
+class ProfileStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username="stats_reader")
+        cls.author = User.objects.create_user(username="stats_author")
+
+    def test_counters_follow_changes(self):
+        """ счётчики профиля меняются вместе с постами, комментариями и подписками """
+        post = Post.objects.create(text="Пост", author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text="Комментарий")
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        author_stats = ProfileStats.objects.get(user=self.author)
+        reader_stats = ProfileStats.objects.get(user=self.reader)
+        self.assertEqual(author_stats.post_count, 1)
+        self.assertEqual(author_stats.follower_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(reader_stats.comment_count, 1)
+        follow.delete()
+        post.delete()
+        author_stats.refresh_from_db()
+        reader_stats.refresh_from_db()
+        self.assertEqual(author_stats.post_count, 0)
+        self.assertEqual(author_stats.follower_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+        self.assertEqual(reader_stats.comment_count, 0)
+
+    def test_recount_fixes_drift(self):
+        """ пересчёт исправляет рассинхронизированные счётчики """
+        Post.objects.create(text="Пост", author=self.author)
+        ProfileStats.objects.filter(user=self.author).update(post_count=42)
+        self.assertEqual(recount_all(), 1)
+        self.assertEqual(ProfileStats.objects.get(user=self.author).post_count, 1)
+
+
+class IndexUsageTest(TestCase):
+    """ основные запросы страниц читаются по индексам, без полного
+    просмотра таблицы постов и без сортировки во временном дереве """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(title="Группа", slug="group")
+        cls.post = Post.objects.create(text="Пост", author=cls.author, group=cls.group)
+
+    def assertUsesIndex(self, queryset):
+        if connection.vendor != "sqlite":
+            self.skipTest("планы запросов проверяются на SQLite")
+        plan = queryset.explain()
+        self.assertIn("INDEX", plan)
+        for line in plan.splitlines():
+            if "SCAN" in line and "posts_" in line:
+                self.assertIn("INDEX", line, plan)
+        self.assertNotIn("TEMP B-TREE FOR ORDER BY", plan)
+        return plan
+
+    def test_index_feed(self):
+        plan = self.assertUsesIndex(feed_queryset()[:10])
+        self.assertIn("posts_post USING INDEX", plan)
+
+    def test_group_feed(self):
+        self.assertUsesIndex(feed_queryset(self.group.posts.all())[:10])
+
+    def test_profile_feed(self):
+        self.assertUsesIndex(feed_queryset(self.author.posts.all())[:10])
+
+    def test_follow_feed(self):
+        reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=reader, author=self.author)
+        plan = self.assertUsesIndex(feed_queryset(follow_feed(reader))[:10])
+        self.assertIn("posts_timeline USING COVERING INDEX", plan)
+
+    def test_post_comments(self):
+        self.assertUsesIndex(self.post.comments.order_by("-created")[:10])
+
+    def test_follow_lookup(self):
+        plan = self.assertUsesIndex(
+            Follow.objects.filter(user=self.author, author=self.author)
+        )
+        self.assertIn("user_id=? AND author_id=?", plan)
+
+    def test_follow_unique(self):
+        reader = User.objects.create_user(username="reader")
+        Follow.objects.create(user=reader, author=self.author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=reader, author=self.author)
+
+
+class GroupCountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="group_author")
+        cls.first = Group.objects.create(title="Первая", slug="first")
+        cls.second = Group.objects.create(title="Вторая", slug="second")
+
+    def counters(self, group):
+        group.refresh_from_db()
+        return group.post_count, group.last_post_at
+
+    def test_counters_follow_posts(self):
+        """ число записей и дата последней меняются вместе с постами """
+        old = Post.objects.create(text="Старый", author=self.author, group=self.first)
+        new = Post.objects.create(text="Новый", author=self.author, group=self.first)
+        self.assertEqual(self.counters(self.first), (2, new.pub_date))
+        new.group = self.second
+        new.save()
+        self.assertEqual(self.counters(self.first), (1, old.pub_date))
+        self.assertEqual(self.counters(self.second), (1, new.pub_date))
+        old.delete()
+        self.assertEqual(self.counters(self.first), (0, None))
+        self.assertEqual(list(groups.directory()), [self.second, self.first])
+
+    def test_recount_fixes_drift(self):
+        Post.objects.create(text="Пост", author=self.author, group=self.first)
+        Group.objects.update(post_count=5)
+        self.assertEqual(groups.recount(), 2)
+        self.assertEqual(self.counters(self.first)[0], 1)
+
+    def test_slug_cache_follows_changes(self):
+        """ группа из кэша процесса обновляется после изменений """
+        self.assertEqual(groups.get_by_slug("first").post_count, 0)
+        with self.assertNumQueries(0):
+            groups.get_by_slug("first")
+        Post.objects.create(text="Пост", author=self.author, group=self.first)
+        self.assertEqual(groups.get_by_slug("first").post_count, 1)
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import profiling
+from posts.middleware import ProfilingMiddleware
+from posts.models import Post
+
+
+User = get_user_model()
+
+
+@override_settings(POSTS_PROFILING_TOKEN="secret")
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username="staff", is_staff=True)
+        cls.author = User.objects.create_user(username="profiled_author")
+        Post.objects.create(text="Пост", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_header_sampled_request_is_recorded(self):
+        """ запрос с заголовком попадает в итоги страницы, без заголовка нет """
+        self.client.get(reverse("index"), HTTP_X_PROFILE="secret")
+        self.client.get(reverse("profile", args=[self.author.username]))
+        self.client.get(reverse("index"), HTTP_X_PROFILE="wrong")
+        stats = self.staff_client.get(reverse("profiling")).json()
+        self.assertEqual(list(stats), ["index"])
+        index = stats["index"]
+        self.assertEqual(index["requests"], 1)
+        self.assertGreater(index["sql_queries_per_request"], 0)
+        self.assertGreater(index["template_ms_per_request"], 0)
+        self.assertGreater(index["totals"]["cache_misses"], 0)
+        self.assertEqual(index["totals"]["buckets"][-1], 1)
+
+    def test_prometheus_format(self):
+        self.client.get(reverse("index"), HTTP_X_PROFILE="secret")
+        response = self.staff_client.get(reverse("profiling_metrics"))
+        self.assertEqual(response["Content-Type"].split(";")[0], "text/plain")
+        text = response.content.decode()
+        self.assertIn('posts_request_duration_seconds_count{view="index"} 1', text)
+        self.assertIn('posts_request_duration_seconds_bucket{view="index",le="+Inf"} 1', text)
+        self.assertIn("# TYPE posts_sql_queries_total counter", text)
+
+    def test_template_stacks(self):
+        """ время и запросы разложены по шаблонам и включениям страницы """
+        self.client.get(
+            reverse("profile", args=[self.author.username]), HTTP_X_PROFILE="secret"
+        )
+        response = self.staff_client.get(reverse("profiling_templates"))
+        stacks = dict(line.rsplit(" ", 1) for line in response.content.decode().splitlines())
+        self.assertIn("profile;profile.html", stacks)
+        self.assertIn("profile;profile.html;base.html", stacks)
+        self.assertTrue(
+            any(stack.startswith("profile;profile.html;") and "includes/" in stack
+                for stack in stacks)
+        )
+        self.assertTrue(all(int(value) > 0 for value in stacks.values()))
+        response = self.staff_client.get(reverse("profiling_templates"), {"metric": "queries"})
+        queries = dict(line.rsplit(" ", 1) for line in response.content.decode().splitlines())
+        self.assertTrue(all(stack.endswith(";SQL") for stack in queries))
+        self.assertEqual(
+            sum(map(int, queries.values())),
+            self.staff_client.get(reverse("profiling")).json()["profile"]["totals"]["sql_queries"],
+        )
+
+    def test_staff_only(self):
+        for name in ("profiling", "profiling_metrics", "profiling_templates"):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 302)
+
+    @override_settings(POSTS_PROFILING_TOKEN="", POSTS_PROFILING_SAMPLE_RATE=0)
+    def test_disabled_middleware_not_used(self):
+        """ выключенное профилирование убирает middleware из цепочки """
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
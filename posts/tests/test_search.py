@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, Comment
+from posts.stemmer import stem
+
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """ формы одного слова сводятся к одной основе """
+        self.assertEqual(stem("книга"), "книг")
+        self.assertEqual(stem("книгами"), "книг")
+        self.assertEqual(stem("Ёлки"), "елк")
+        self.assertEqual(stem("подписались"), stem("подписался"))
+        self.assertEqual(stem("Django"), "django")
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="reader")
+        cls.about_books = Post.objects.create(
+            text="Читаю интересные книги по вечерам", author=cls.user
+        )
+        cls.about_cats = Post.objects.create(text="Мой кот спит весь день", author=cls.user)
+        Comment.objects.create(
+            post=cls.about_cats, author=cls.user, text="А мой кот читает книгу"
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_by_word_form(self):
+        """ поиск находит другие формы слова, выше совпадения в тексте поста """
+        response = self.client.get(reverse("search"), {"q": "книгой"})
+        self.assertEqual(list(response.context["page"]), [self.about_books, self.about_cats])
+        self.assertContains(response, "Читаю интересные книги")
+
+    def test_index_follows_changes(self):
+        """ индекс обновляется при правке и удалении постов и комментариев """
+        self.assertEqual(list(search.search_posts("собака")), [])
+        Comment.objects.create(post=self.about_books, author=self.user, text="Про собак?")
+        self.assertEqual(list(search.search_posts("собака")), [self.about_books])
+        cats = Post.objects.get(pk=self.about_cats.pk)
+        cats.text = "Собака спит"
+        cats.save()
+        self.assertEqual(len(search.search_posts("собака")), 2)
+        Post.objects.filter(pk=self.about_books.pk).delete()
+        self.assertEqual(list(search.search_posts("собака")), [cats])
+
+    def test_comment_updates_only_its_terms(self):
+        """ запись комментария не перечитывает остальные комментарии поста,
+        удаление убирает только его слова """
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                post=self.about_cats, author=self.user, text="Кот любит книги"
+            )
+        self.assertFalse(
+            [query for query in queries if 'FROM "posts_comment"' in query["sql"]]
+        )
+        comment.text = "Собака"
+        comment.save()
+        self.assertEqual(list(search.search_posts("собака")), [self.about_cats])
+        self.assertEqual(
+            list(search.search_posts("книгой")), [self.about_books, self.about_cats]
+        )
+        comment.delete()
+        self.assertEqual(list(search.search_posts("собака")), [])
+        # основа "книг" осталась от первого комментария
+        self.assertEqual(list(search.search_posts("кот книгу")), [self.about_cats])
+
+    def test_rebuild(self):
+        """ пересборка восстанавливает индекс с нуля """
+        self.assertEqual(search.rebuild(), 2)
+        self.assertEqual(list(search.search_posts("кот день")), [self.about_cats])
+        self.assertEqual(
+            list(search.search_posts("книгой")), [self.about_books, self.about_cats]
+        )
+
+    def test_empty_query(self):
+        response = self.client.get(reverse("search"), {"q": " ?! "})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page"]), 0)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as default_cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import cache, search
+from posts.models import Comment, Follow, Group, Post, ProfileStats, Timeline
+
+
+User = get_user_model()
+
+
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer")
+        self.reader = User.objects.create_user(username="reader")
+        self.group = Group.objects.create(title="Группа", slug="group", description="О")
+        self.post = Post.objects.create(text="Пост про котов", author=self.author, group=self.group)
+        self.comment = Comment.objects.create(post=self.post, author=self.reader, text="Мяу")
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def round_trip(self, ext, before_import=lambda: None):
+        files = {}
+        for name in ("group", "post", "comment", "follow"):
+            files[name] = os.path.join(self.directory, f"{name}.{ext}")
+            call_command("export_data", name, output=files[name], stderr=StringIO())
+        Group.objects.all().delete()
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.filter(username="reader").delete()
+        before_import()
+        for name in ("group", "post", "comment", "follow"):
+            call_command("import_data", name, files[name], stdout=StringIO())
+
+    def check_restored(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, self.post.pub_date)
+        self.assertEqual(post.group_id, self.group.pk)
+        comment = Comment.objects.get(pk=self.comment.pk)
+        self.assertEqual(comment.created, self.comment.created)
+        reader = User.objects.get(username="reader")
+        self.assertFalse(reader.has_usable_password())
+        self.assertEqual(comment.author, reader)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).post_count, 1)
+        self.assertEqual(ProfileStats.objects.get(user=self.author).follower_count, 1)
+        self.assertTrue(Timeline.objects.filter(user=reader, post=post).exists())
+        self.assertEqual(list(search.search_posts("котами")), [post])
+        self.assertEqual(list(search.search_posts("мяу")), [post])
+
+    def test_ndjson_round_trip(self):
+        """ выгрузка и загрузка сохраняют id, даты и пересчитывают
+        производные данные """
+        self.round_trip("ndjson")
+        self.check_restored()
+
+    def test_csv_round_trip(self):
+        self.round_trip("csv")
+        self.check_restored()
+
+    def test_import_bumps_scopes_and_keeps_cache(self):
+        """ загрузка сдвигает версии затронутых областей, а не очищает
+        весь общий кэш """
+        scopes = ["feed", "posts", f"group:{self.group.pk}", f"author:{self.author.pk}"]
+        versions = {}
+
+        def remember():
+            default_cache.set("unrelated", "kept")
+            versions.update(cache.get_versions(*scopes))
+
+        self.round_trip("ndjson", remember)
+        self.assertEqual(default_cache.get("unrelated"), "kept")
+        changed = cache.get_versions(*scopes)
+        for scope in scopes:
+            self.assertNotEqual(changed[scope], versions[scope], scope)
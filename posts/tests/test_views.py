@@ -1,19 +1,40 @@
+import base64
+import json
 import os
+import shutil
+import tempfile
+
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
+from django.core.paginator import Paginator
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.db import connection
+from django.db.models import QuerySet
+from django.template import engines
+from django.template.loader import render_to_string
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from PIL import Image
 
+from posts import warmup
+from posts.counting import feed_count
+from posts.feeds import feed_queryset
 from posts.models import Post, Group, Follow, Comment
+from posts.paginator import CursorPage, page_window
 
 
 User = get_user_model()
+MEDIA_ROOT = tempfile.mkdtemp()
 
 
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
 class PostsTestViews(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
@@ -24,7 +45,6 @@ class PostsTestViews(TestCase):
         cls.authorized_user_2 = Client()
         cls.authorized_user_2.force_login(cls.user_2)
         cls.unauthorized_client = Client()
-        cls.key = make_template_fragment_key("index_page")
         cls.group_1 = Group.objects.create(
             title="Тестовая группа 1",
             slug="test-group-1",
@@ -39,6 +59,9 @@ class PostsTestViews(TestCase):
             text="Тестовый пост 1", author=cls.user, group=cls.group_1
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_new_post(self):
         """ проверяем публикацию поста для авторизированного пользователя """
         current_posts_count = Post.objects.count()
@@ -129,8 +152,6 @@ class PostsTestViews(TestCase):
         self.assertEqual(update_post.status_code, 200)
         self.assertContains(update_post, "<img")
 
-        cache.touch(self.key, 0)
-
         for url in url_reverse:
             response = self.authorized_client.get(url)
             self.img_test(response)
@@ -167,15 +188,24 @@ class PostsTestViews(TestCase):
     def test_cache_index(self):
         """проверка работы кэширования страницы index"""
         old_response = self.authorized_client.get(reverse("index"))
+        Post.objects.filter(pk=self.post.pk).update(text="Изменено в обход сигналов")
+        cached_response = self.authorized_client.get(reverse("index"))
+        self.assertEqual(old_response.content, cached_response.content)
         url = reverse("new_post")
         response = self.authorized_client.post(
             url, {"text": "Текст публикации", "group": self.group_1.id}, follow=True
         )
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(old_response.content, response.content)
-        cache.touch(self.key, 0)
-        new_response = self.authorized_client.get(reverse("index"))
-        self.assertNotEqual(old_response.content, new_response.content)
+        self.assertNotEqual(old_response.content, response.content)
+        self.assertContains(response, "Текст публикации")
+
+    def test_cache_post_card(self):
+        """карточка поста сбрасывается при новом комментарии"""
+        url = reverse("group_posts", args=[self.group_1.slug])
+        self.unauthorized_client.get(url)
+        Comment.objects.create(post=self.post, author=self.user_2, text="Комментарий")
+        response = self.unauthorized_client.get(url)
+        self.assertContains(response, "Комментариев: 1")
 
     def test_follow_authorized_user(self):
         """ проверяем возможность пользователя подписаться """
@@ -232,3 +262,329 @@ class PostsTestViews(TestCase):
             status_code=302,
             target_status_code=200,
         )
+
+
+@override_settings(POSTS_PAGINATION_MODE="cursor")
+class CursorPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="cursor_author")
+        cls.client = Client()
+        for i in range(25):
+            Post.objects.create(text=f"Пост {i}", author=cls.user)
+
+    def test_walk_forward_and_back(self):
+        """ курсоры ведут по всей ленте вперёд и обратно без повторов """
+        url = reverse("profile", args=[self.user])
+        response = self.client.get(url)
+        self.assertIsInstance(response.context["page"], CursorPage)
+        self.assertIsNone(response.context["paginator"].count)
+        pages = [list(response.context["page"])]
+        while response.context["page"].has_next():
+            cursor = response.context["page"].next_page_number()
+            response = self.client.get(url, {"page": cursor})
+            pages.append(list(response.context["page"]))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), list(Post.objects.filter(author=self.user)))
+        cursor = response.context["page"].previous_page_number()
+        response = self.client.get(url, {"page": cursor})
+        self.assertEqual(list(response.context["page"]), pages[1])
+
+    def test_bad_cursor_gives_first_page(self):
+        """ испорченный курсор открывает первую страницу """
+        response = self.client.get(reverse("index"), {"page": "garbage"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["page"].has_previous())
+
+    def test_crafted_cursor_gives_first_page(self):
+        """ пустые значения и числа вне диапазона базы в курсоре не ломают
+        ни страницы лент, ни API, ни догрузку комментариев """
+        post = Post.objects.filter(author=self.user).first()
+        for values in (["next", None, None], ["next", "2020-01-01T00:00:00", "9" * 23]):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            for url, param in (
+                (reverse("profile", args=[self.user]), "page"),
+                (reverse("api_index"), "cursor"),
+                (reverse("post_comments", args=[self.user, post.pk]), "cursor"),
+            ):
+                with self.subTest(values=values, url=url):
+                    response = self.client.get(url, {param: cursor.rstrip("=")})
+                    self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse("api_index"), {"cursor": cursor})
+        self.assertIsNone(response.json()["previous"])
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="feed_author")
+        cls.group = Group.objects.create(
+            title="Тестовая группа", slug="feed-group", description="Описание"
+        )
+        cls.client = Client()
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(text=f"Пост {i}", author=self.user, group=self.group)
+            Comment.objects.create(post=post, author=self.user, text="Комментарий")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_posts(self):
+        """ число запросов на страницу ленты не зависит от числа постов """
+        urls = [
+            reverse("group_posts", args=[self.group.slug]),
+            reverse("profile", args=[self.user]),
+        ]
+        self.add_posts(1)
+        single = [self.count_queries(url) for url in urls]
+        self.add_posts(9)
+        full = [self.count_queries(url) for url in urls]
+        self.assertEqual(single, full)
+
+    def test_group_page_without_count(self):
+        """ пагинатор страницы группы берёт число записей из группы """
+        self.add_posts(3)
+        url = reverse("group_posts", args=[self.group.slug])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"page": 1})
+        self.assertEqual(response.context["paginator"].count, 3)
+        self.assertFalse([q for q in queries if "__count" in q["sql"]])
+
+    def test_group_index(self):
+        self.add_posts(1)
+        response = self.client.get(reverse("group_index"))
+        self.assertContains(response, "Записей: 1")
+
+    def test_comment_count_annotation(self):
+        """ карточка поста выводит число комментариев из аннотации """
+        self.add_posts(1)
+        response = self.client.get(reverse("profile", args=[self.user]))
+        self.assertEqual(response.context["page"][0].comment_count, 1)
+        self.assertContains(response, "Комментариев: 1")
+
+
+@override_settings(POSTS_COMMENTS_PER_PAGE=10)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="commentator")
+        cls.post = Post.objects.create(text="Обсуждаемый пост", author=cls.user)
+        cls.client = Client()
+        for i in range(25):
+            Comment.objects.create(post=cls.post, author=cls.user, text=f"Комментарий {i}")
+
+    def test_first_paint_and_fragments(self):
+        """ сначала выводятся самые новые комментарии, остальные
+        догружаются порциями без повторов """
+        response = self.client.get(reverse("post", args=[self.user, self.post.pk]))
+        self.assertIsInstance(response.context["comments"], QuerySet)
+        seen = list(response.context["comments"])
+        cursor = response.context["comments_cursor"]
+        self.assertEqual(len(seen), 10)
+        url = reverse("post_comments", args=[self.user, self.post.pk])
+        while cursor:
+            response = self.client.get(url, {"cursor": cursor})
+            self.assertNotContains(response, "<html")
+            seen += list(response.context["comments"])
+            cursor = response.context["comments_cursor"]
+        self.assertEqual(seen, list(self.post.comments.order_by("-created", "-pk")))
+
+    def test_comment_authors_joined(self):
+        """ авторы комментариев приходят тем же запросом """
+        url = reverse("post_comments", args=[self.user, self.post.pk])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertLessEqual(len(queries), 3)
+
+
+class ConditionalPagesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="conditional_author")
+        cls.reader = User.objects.create_user(username="conditional_reader")
+        cls.group = Group.objects.create(title="Группа", slug="conditional")
+        Post.objects.create(text="Пост", author=cls.author, group=cls.group)
+        cls.client = Client()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_not_modified(self):
+        """ анонимный посетитель получает 304 без рендеринга шаблона """
+        for url in (
+            reverse("index"),
+            reverse("group_posts", args=[self.group.slug]),
+            reverse("profile", args=[self.author]),
+        ):
+            response = self.client.get(url)
+            self.assertIn("public", response["Cache-Control"])
+            self.assertIn("max-age", response["Cache-Control"])
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+            self.assertIsNone(response.context)
+
+    def test_follow_changes_profile(self):
+        """ подписка меняет счётчики профиля, а с ними и ETag """
+        url = reverse("profile", args=[self.author])
+        etag = self.client.get(url)["ETag"]
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Подписчиков: 1")
+
+    def test_group_rename_changes_cards(self):
+        """ новое название и slug группы видны в карточках всех лент """
+        urls = (reverse("index"), reverse("profile", args=[self.author]))
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = "Новое название"
+        group.slug = "renamed"
+        group.save()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "#Новое название")
+            self.assertContains(response, reverse("group_posts", args=["renamed"]))
+
+    def test_authenticated_private(self):
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse("index"))
+        self.assertIn("private", response["Cache-Control"])
+        self.assertFalse(response.has_header("ETag"))
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="page_cache_author")
+        cls.post = Post.objects.create(text="Пост", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hit_without_orm(self):
+        """ повторный анонимный запрос отдаётся из кэша без запросов к БД,
+        новый пост сбрасывает сохранённые страницы """
+        url = reverse("post", args=[self.author, self.post.pk])
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Пост")
+        Comment.objects.create(post=self.post, author=self.author, text="Новый")
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Новый")
+
+    def test_bypass_with_session_or_messages(self):
+        url = reverse("index")
+        self.client.get(url)
+        self.client.cookies["messages"] = "pending"
+        self.assertFalse(self.client.get(url).has_header("X-Page-Cache"))
+        del self.client.cookies["messages"]
+        self.client.force_login(self.author)
+        self.assertFalse(self.client.get(url).has_header("X-Page-Cache"))
+
+
+class TemplateWarmupTest(TestCase):
+    def test_project_templates_precompiled(self):
+        """ шаблоны проекта лежат в кэше загрузчика ещё до первого запроса """
+        engine = engines["django"].engine
+        self.assertTrue(warmup.uses_cached_loader(engine))
+        count, _ = warmup.warm_up(engine)
+        self.assertGreaterEqual(count, 20)
+        cached = engine.template_loaders[0].get_template_cache
+        for name in ("index.html", "includes/post_item.html", "signup.html"):
+            self.assertIn(name, cached)
+
+
+class PageWindowTest(TestCase):
+    def test_window(self):
+        self.assertEqual(list(page_window(1, 5)), [1, 2, 3, 4, 5])
+        self.assertEqual(
+            list(page_window(50, 100)),
+            [1, 2, None, 47, 48, 49, 50, 51, 52, 53, None, 99, 100],
+        )
+        self.assertEqual(list(page_window(2, 100)), [1, 2, 3, 4, 5, None, 99, 100])
+        self.assertEqual(list(page_window(100, 100)), [1, 2, None, 97, 98, 99, 100])
+        self.assertEqual(list(page_window("cursor", None)), [])
+
+    def test_links_do_not_grow_with_pages(self):
+        """ число ссылок навигации ограничено при любом числе страниц """
+        page = Paginator(range(100_000), 10).get_page(5000)
+        html = render_to_string(
+            "includes/paginator.html", {"items": page, "paginator": page.paginator}
+        )
+        self.assertEqual(html.count('class="page-item'), 2 + 13)
+        self.assertIn("page=10000", html)
+        self.assertIn("&hellip;", html)
+
+
+class FeedCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="count_author")
+        for i in range(3):
+            Post.objects.create(text=f"Пост {i}", author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def index_counts(self):
+        """ число записей в пагинаторе главной и выполненные COUNT(*) """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("index"))
+        counts = [q for q in queries if "COUNT(*)" in q["sql"] and "posts_post" in q["sql"]]
+        return response.context["paginator"].count, len(counts)
+
+    def test_cached_count_until_feed_changes(self):
+        """ COUNT(*) главной выполняется один раз на версию ленты """
+        self.assertEqual(self.index_counts(), (3, 1))
+        self.assertEqual(self.index_counts(), (3, 0))
+        post = Post.objects.create(text="Новый пост", author=self.user)
+        self.assertEqual(self.index_counts(), (4, 1))
+        # комментарии и правки текста числа постов не меняют
+        Comment.objects.create(post=post, author=self.user, text="Комментарий")
+        post.text = "Исправленный пост"
+        post.save()
+        self.assertEqual(self.index_counts(), (4, 0))
+        post.delete()
+        self.assertEqual(self.index_counts(), (3, 1))
+
+    @override_settings(POSTS_COUNT_STRATEGIES={"index": "exact"})
+    def test_exact_count(self):
+        self.assertEqual(self.index_counts(), (3, 1))
+        self.assertEqual(self.index_counts(), (3, 1))
+
+    @override_settings(
+        POSTS_COUNT_STRATEGIES={"index": "estimate"}, POSTS_COUNT_EXACT_BELOW=0
+    )
+    def test_planner_estimate(self):
+        """ оценка берётся из статистики ANALYZE, без неё - кэшированный COUNT """
+        post_list = feed_queryset()
+        self.assertEqual(feed_count("index", post_list, ["posts"]), 3)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE posts_post")
+        Post.objects.create(text="После ANALYZE", author=self.user)
+        self.assertEqual(self.index_counts(), (3, 0))
+        with self.settings(POSTS_COUNT_EXACT_BELOW=100):
+            self.assertEqual(self.index_counts(), (4, 1))
+
+    def test_profile_uses_maintained_counter(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("profile", args=[self.user.username]))
+        self.assertEqual(response.context["paginator"].count, 3)
+        self.assertFalse([q for q in queries if "COUNT(*)" in q["sql"]])
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from . import cache, imaging
+from .models import Post
+from .storage import post_storage
+
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, "POSTS_THUMBNAIL_WORKERS", 2),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def variant_base(image_name):
+    """ общий префикс имён вариантов картинки в хранилище """
+    digest = hashlib.sha1(image_name.encode()).hexdigest()
+    return f"thumbnails/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def store(post_id, image_name, variants):
+    """ сохраняет метаданные готовых вариантов, если картинку поста
+    не успели сменить; миниатюрой служит самый широкий JPEG """
+    base = variant_base(image_name)
+    for variant in variants:
+        variant["name"] = f"{base}-{variant['width']}.{variant['format']}"
+    jpegs = [variant for variant in variants if variant["format"] == "jpg"]
+    thumbnail = max(jpegs, key=lambda variant: variant["width"])["name"]
+    updated = Post.objects.filter(pk=post_id, image=image_name).update(
+        thumbnail=thumbnail, image_variants=json.dumps(variants)
+    )
+    post = Post.objects.filter(pk=post_id).values("author_id", "group_id").first()
+    if updated and post is not None:
+        cache.bump(*cache.post_scopes(post_id, **post))
+
+
+def render(post_id, image_name):
+    """ делает варианты картинки в текущем процессе """
+    variants = imaging.render_variants(
+        post_storage.path(image_name),
+        default_storage.path(variant_base(image_name)),
+    )
+    store(post_id, image_name, variants)
+
+
+def _done(post_id, image_name, future):
+    """ вызывается в служебном потоке пула, соединение с БД у него своё """
+    error = future.exception()
+    if error is not None:
+        logger.error("Не удалось сделать миниатюру поста %s: %s", post_id, error)
+        return
+    try:
+        store(post_id, image_name, future.result())
+    except Exception:
+        logger.exception("Не удалось сохранить миниатюру поста %s", post_id)
+    finally:
+        connection.close()
+
+
+def _submit(post_id, image_name):
+    if not getattr(settings, "POSTS_THUMBNAILS_ASYNC", True):
+        render(post_id, image_name)
+        return
+    future = _pool().submit(
+        imaging.render_variants,
+        post_storage.path(image_name),
+        default_storage.path(variant_base(image_name)),
+    )
+    future.add_done_callback(partial(_done, post_id, image_name))
+
+
+def schedule(post):
+    """ после коммита ставит генерацию вариантов картинки в очередь пула """
+    if not post.image:
+        return
+    image_name = post.image.name
+    transaction.on_commit(partial(_submit, post.pk, image_name))
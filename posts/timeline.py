@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .feeds import FEED_ORDERING, MergedFeed
+from .models import Follow, Post, ProfileStats, Timeline
+
+
+BATCH_SIZE = 500
+
+
+def fanout_limit():
+    """ число подписчиков, начиная с которого посты автора не раскладываются
+    по лентам, а подмешиваются при чтении """
+    return getattr(settings, "POSTS_FANOUT_MAX_FOLLOWERS", 10000)
+
+
+def is_celebrity(author_id):
+    """ слишком много подписчиков для fan-out-on-write """
+    return ProfileStats.objects.filter(
+        user_id=author_id, follower_count__gt=fanout_limit()
+    ).exists()
+
+
+def celebrity_authors(user):
+    """ авторы из подписок пользователя, чьи посты читаются напрямую """
+    return list(
+        Follow.objects.filter(
+            user=user, author__stats__follower_count__gt=fanout_limit()
+        ).values_list("author", flat=True)
+    )
+
+
+def _bulk_insert(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """ раскладывает новый пост по лентам подписчиков автора """
+    if is_celebrity(post.author_id):
+        return
+    followers = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list("user_id", flat=True)
+        .iterator()
+    )
+    _bulk_insert(
+        Timeline(
+            user_id=user_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in followers
+    )
+
+
+def backfill(user_id, author_id):
+    """ добавляет в ленту подписчика уже опубликованные посты автора """
+    if is_celebrity(author_id):
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .values_list("pk", "pub_date")
+        .iterator()
+    )
+    _bulk_insert(
+        Timeline(
+            user_id=user_id, post_id=post_id, author_id=author_id, pub_date=pub_date
+        )
+        for post_id, pub_date in posts
+    )
+
+
+def prune(user_id, author_id):
+    """ убирает посты автора из ленты отписавшегося пользователя """
+    Timeline.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def _insert_from(follows, entries):
+    """ заменяет записи entries постами авторов из подписок follows одним
+    INSERT ... SELECT: построчная вставка из Python на сотнях тысяч записей
+    тратит время на подготовку значений и фиксацию пачек """
+    sql, params = (
+        follows.order_by()
+        .filter(author__posts__isnull=False)
+        .values_list("user_id", "author__posts__pk", "author_id", "author__posts__pub_date")
+        .query.sql_with_params()
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        entries.delete()
+        cursor.execute(
+            f"INSERT INTO {Timeline._meta.db_table} (user_id, post_id, author_id, pub_date) "
+            f"{sql}",
+            params,
+        )
+
+
+def rebuild(user_id=None):
+    """ пересобирает ленты целиком (или ленту одного пользователя) """
+    follows = Follow.objects.exclude(author__stats__follower_count__gt=fanout_limit())
+    entries = Timeline.objects.all()
+    if user_id is not None:
+        follows = follows.filter(user_id=user_id)
+        entries = entries.filter(user_id=user_id)
+    _insert_from(follows, entries)
+
+
+def follower_removed(author_id):
+    """ автор, у которого подписчиков стало не больше порога, перестаёт
+    быть популярным: его посты, опубликованные без fan-out, и посты,
+    пропущенные при подписке, раскладываются по лентам всех подписчиков """
+    demoted = ProfileStats.objects.filter(
+        user_id=author_id, follower_count=fanout_limit()
+    ).exists()
+    if demoted:
+        follows = Follow.objects.filter(author_id=author_id)
+        # по индексу (user, author), а не проходом по всей таблице лент
+        entries = Timeline.objects.filter(
+            user__in=follows.values("user"), author_id=author_id
+        )
+        _insert_from(follows, entries)
+
+
+def timeline_posts(user):
+    """ посты ленты пользователя в порядке индекса (user, -pub_date, -post):
+    страница читается диапазоном индекса ленты, посты подтягиваются по
+    первичному ключу """
+    # F, а не строка: строка "timeline__post" сортировала бы по ordering Post
+    return Post.objects.filter(timeline__user=user).order_by(
+        F("timeline__pub_date").desc(), F("timeline__post").desc()
+    )
+
+
+def follow_feed(user):
+    """ посты авторов, на которых подписан пользователь. Посты популярных
+    авторов в ленте не хранятся и подмешиваются при чтении """
+    celebrities = celebrity_authors(user)
+    if not celebrities:
+        return timeline_posts(user)
+    # записи, разложенные до того, как автор стал популярным, читаются
+    # вместе с остальными его постами
+    return MergedFeed(
+        timeline_posts(user).exclude(author__in=celebrities),
+        Post.objects.filter(author__in=celebrities).order_by(*FEED_ORDERING),
+    )
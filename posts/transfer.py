@@ -0,0 +1,271 @@
+"""
+Потоковые выгрузка и загрузка данных в NDJSON и CSV.
+
+Файл читается и пишется построчно, в памяти держится только одна пачка
+строк, поэтому размер файла не важен. Загрузка идёт через bulk_create без
+сигналов на каждую строку, с сохранением id. Поисковый индекс и версии
+областей кэша обновляются для строк каждой загруженной пачки, остальные
+производные данные (счётчики, ленты подписок) после загрузки
+пересчитываются целиком.
+Пользователи в файлах указываются по username, чтобы данные переносились
+между базами с разными id пользователей.
+"""
+import csv
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from . import cache, groups, search, stats, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+FORMATS = ("ndjson", "csv")
+BATCH_SIZE = 1000
+
+
+class Spec:
+    """ описание выгружаемой модели: колонка файла, поле для выборки
+    и атрибут модели при загрузке; indexed - атрибут с id поста, запись
+    поискового индекса которого меняется при загрузке строки; scopes -
+    области кэша, которые затрагивает пачка загруженных объектов """
+
+    def __init__(self, model, columns, users=(), indexed=None, scopes=None):
+        self.model = model
+        self.columns = columns
+        self.users = set(users)
+        self.indexed = indexed
+        self.scopes = scopes
+
+    @property
+    def names(self):
+        return [column for column, _, _ in self.columns]
+
+
+def _group_scopes(objects):
+    for group in objects:
+        groups.forget(group.slug)
+        yield from ("pages", f"group:{group.pk}")
+
+
+def _post_scopes(objects):
+    for post in objects:
+        yield from cache.post_scopes(post.pk, post.author_id, post.group_id)
+        yield from cache.count_scopes(post.author_id, post.group_id)
+        yield f"profile:{post.author_id}"
+
+
+def _comment_scopes(objects):
+    posts = Post.objects.filter(pk__in={comment.post_id for comment in objects})
+    for post_id, author_id, group_id in posts.values_list("pk", "author_id", "group_id"):
+        yield from cache.post_scopes(post_id, author_id, group_id)
+    for comment in objects:
+        yield f"profile:{comment.author_id}"
+
+
+def _follow_scopes(objects):
+    for follow in objects:
+        yield from (
+            "pages",
+            f"follow:{follow.user_id}",
+            f"profile:{follow.user_id}",
+            f"profile:{follow.author_id}",
+        )
+
+
+SPECS = {
+    "group": Spec(
+        Group,
+        [
+            ("id", "id", "id"),
+            ("title", "title", "title"),
+            ("slug", "slug", "slug"),
+            ("description", "description", "description"),
+        ],
+        scopes=_group_scopes,
+    ),
+    "post": Spec(
+        Post,
+        [
+            ("id", "id", "id"),
+            ("text", "text", "text"),
+            ("pub_date", "pub_date", "pub_date"),
+            ("author", "author__username", "author_id"),
+            ("group", "group_id", "group_id"),
+            ("image", "image", "image"),
+        ],
+        users=["author"],
+        indexed="id",
+        scopes=_post_scopes,
+    ),
+    "comment": Spec(
+        Comment,
+        [
+            ("id", "id", "id"),
+            ("post", "post_id", "post_id"),
+            ("author", "author__username", "author_id"),
+            ("text", "text", "text"),
+            ("created", "created", "created"),
+        ],
+        users=["author"],
+        indexed="post_id",
+        scopes=_comment_scopes,
+    ),
+    "follow": Spec(
+        Follow,
+        [
+            ("id", "id", "id"),
+            ("user", "user__username", "user_id"),
+            ("author", "author__username", "author_id"),
+        ],
+        users=["user", "author"],
+        scopes=_follow_scopes,
+    ),
+}
+
+
+def export_rows(spec):
+    """ строки модели словарями колонка -> значение, в порядке id """
+    lookups = [lookup for _, lookup, _ in spec.columns]
+    rows = spec.model.objects.order_by("pk").values_list(*lookups)
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        yield dict(zip(spec.names, row))
+
+
+def write(spec, rows, stream, fmt):
+    """ пишет строки в поток; возвращает их число """
+    total = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=spec.names)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(
+                {
+                    name: "" if value is None else _plain(value)
+                    for name, value in row.items()
+                }
+            )
+            total += 1
+        return total
+    # не DjangoJSONEncoder: тот обрезает микросекунды у дат
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_plain)
+    for row in rows:
+        stream.write(encoder.encode(row))
+        stream.write("\n")
+        total += 1
+    return total
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def read(stream, fmt):
+    """ строки файла словарями; пустые строки NDJSON пропускаются """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+@contextmanager
+def keep_dates(model):
+    """ auto_now_add перезаписал бы даты из файла текущим временем """
+    fields = [
+        field for field in model._meta.concrete_fields if getattr(field, "auto_now_add", False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _user_ids(usernames):
+    """ id пользователей по username; недостающие создаются без пароля """
+    known = dict(User.objects.filter(username__in=usernames).values_list("username", "pk"))
+    missing = [name for name in usernames if name not in known]
+    if missing:
+        new_users = [User(username=name) for name in missing]
+        for user in new_users:
+            user.set_unusable_password()
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+        known.update(
+            User.objects.filter(username__in=missing).values_list("username", "pk")
+        )
+    return known
+
+
+def _convert(spec, rows):
+    """ объекты модели из строк файла, пачкой """
+    usernames = {row[column] for row in rows for column in spec.users}
+    user_ids = _user_ids(usernames) if usernames else {}
+    objects = []
+    for row in rows:
+        values = {}
+        for column, _, attname in spec.columns:
+            value = row.get(column)
+            if column in spec.users:
+                value = user_ids[value]
+            else:
+                field = spec.model._meta.get_field(attname)
+                if value in ("", None) and field.null:
+                    value = None
+                elif value is None:
+                    value = field.get_default()
+                else:
+                    value = field.to_python(value)
+            values[attname] = value
+        objects.append(spec.model(**values))
+    return objects
+
+
+def load(spec, rows, batch_size=BATCH_SIZE, ignore_conflicts=False):
+    """ загружает строки пачками bulk_create в одной транзакции;
+    возвращает число прочитанных строк """
+    total = 0
+    rows = iter(rows)
+    with transaction.atomic(), keep_dates(spec.model):
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            objects = _convert(spec, batch)
+            spec.model.objects.bulk_create(
+                objects, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+            )
+            if spec.indexed:
+                search.index_posts({getattr(obj, spec.indexed) for obj in objects})
+            if spec.scopes:
+                # версии сдвигаются до фиксации транзакции: страница,
+                # собранная параллельно из старых данных, проживёт в кэше
+                # не дольше таймаута фрагментов
+                cache.bump(*set(spec.scopes(objects)))
+            total += len(batch)
+        _reset_sequences(spec.model)
+    return total
+
+
+def _reset_sequences(model):
+    # id взяты из файла: последовательность (PostgreSQL) надо догнать
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def rebuild(names):
+    """ пересчитывает то, что сигналы поддерживают при обычной работе """
+    names = set(names)
+    if names & {"post", "comment", "follow"}:
+        stats.recount_all()
+    if names & {"group", "post"}:
+        groups.recount()
+    if names & {"post", "follow"}:
+        timeline.rebuild()
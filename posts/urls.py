@@ -6,7 +6,9 @@ from . import views
 urlpatterns = [
     path("follow/", views.follow_index, name="follow_index"),
     path("new/", views.new_post, name="new_post"),
+    path("groups/", views.group_index, name="group_index"),
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
+    path("search/", views.search, name="search"),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"),
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"),
     path(
@@ -25,5 +27,10 @@ urlpatterns = [
     path("<str:username>/", views.profile, name="profile"),
     path("<str:username>/<int:post_id>/", views.post_view, name="post"),
     path("<str:username>/<int:post_id>/edit/", views.post_edit, name="post_edit"),
+    path(
+        "<str:username>/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path("", views.index, name="index"),
 ]
@@ -3,8 +3,17 @@ from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404, redirect
 
+from . import groups
+from .cache import page_version
+from .conditional import anonymous_conditional
+from .counting import feed_count
+from .feeds import feed_queryset
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow, Comment
+from .models import Post, User, Follow, Comment, ProfileStats
+from .paginator import PER_PAGE, comment_paginator, first_comments, paginate
+from .search import search_posts
+from .stats import recount
+from .timeline import follow_feed
 
 
 def page_not_found(request, exception):
@@ -17,27 +26,69 @@ def server_error(request):
     return render(request, "misc/500.html", status=500)
 
 
+def _index_feed(request):
+    return Post.objects.all(), ["feed"]
+
+
+def _group_feed(request, slug):
+    group = groups.get_by_slug(slug)
+    return group.posts.all(), [f"group:{group.pk}"]
+
+
+def _profile_feed(request, username):
+    author = get_object_or_404(User, username=username)
+    return author.posts.all(), [f"author:{author.pk}", f"profile:{author.pk}"]
+
+
+@anonymous_conditional(_index_feed)
 def index(request):
     """ главная страница сайта. Вывод всех публикаций """
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(request, "index.html", {"page": page, "paginator": paginator})
+    post_list = feed_queryset()
+    paginator, page = paginate(
+        request, post_list, count=feed_count("index", post_list, ["posts"])
+    )
+    context = {
+        "page": page,
+        "paginator": paginator,
+        "cache_version": page_version("feed"),
+    }
+    return render(request, "index.html", context)
 
 
+@anonymous_conditional(_group_feed)
 def group_posts(request, slug):
     """ страница группы. Вывод всех публикаций группы. """
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return render(
-        request, "group.html", {"group": group, "page": page, "paginator": paginator}
+    group = groups.get_by_slug(slug)
+    posts = feed_queryset(group.posts.all())
+    count = feed_count(
+        "group_posts", posts, [f"posts:group:{group.pk}"], maintained=group.post_count
     )
+    paginator, page = paginate(request, posts, count=count)
+    context = {
+        "group": group,
+        "page": page,
+        "paginator": paginator,
+        "cache_version": page_version(f"group:{group.pk}"),
+    }
+    return render(request, "group.html", context)
+
+
+def group_index(request):
+    """ каталог групп, сначала самые активные """
+    return render(request, "groups.html", {"groups": groups.directory()})
+
+
+def search(request):
+    """ поиск по тексту постов и комментариев """
+    query = request.GET.get("q", "").strip()
+    paginator = Paginator(search_posts(query), PER_PAGE)
+    page = paginator.get_page(request.GET.get("page"))
+    context = {
+        "query": query,
+        "page": page,
+        "paginator": paginator,
+    }
+    return render(request, "search.html", context)
 
 
 @login_required
@@ -51,42 +102,48 @@ def new_post(request):
     if not form.is_valid():
         form = PostForm(request.POST, files=request.FILES or None)
         return render(request, "new.html", {"form": form})
-    user = form.save(commit=False)
-    user.author = request.user
-    user.save()
+    form.instance.author = request.user
+    form.save()
     messages.add_message(request, messages.SUCCESS, "Запись усешно создана!")
     return redirect("index")
 
 
 def profile_info(_author, _user):
     """ функция собирающая всю информацию по пользователе """
-    author = get_object_or_404(User, username=_author)
-    follow = author.following.filter(user=_user.id).exists()
-    following = author.following.count()
-    follower = author.follower.count()
-    post_cnt = author.posts.count()
+    author = get_object_or_404(User.objects.select_related("stats"), username=_author)
+    try:
+        author_stats = author.stats
+    except ProfileStats.DoesNotExist:
+        author_stats = recount(author)
+    follow = (
+        _user.is_authenticated
+        and author.following.filter(user=_user.id).exists()
+    )
     context = {
         "author": author,
-        "post_cnt": post_cnt,
+        "post_cnt": author_stats.post_count,
         "follow": follow,
-        "following": following,
-        "follower": follower,
+        "following": author_stats.follower_count,
+        "follower": author_stats.following_count,
     }
     return context
 
 
+@anonymous_conditional(_profile_feed)
 def profile(request, username):
     """ страница конкретного пользователя. Отображаются 
     все публикации этого пользователя
      """
     info = profile_info(username, request.user)
-    author_post = info["author"].posts.all()
-    paginator = Paginator(author_post, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    author_post = feed_queryset(info["author"].posts.all())
+    count = feed_count(
+        "profile", author_post, [f"posts:author:{info['author'].pk}"], maintained=info["post_cnt"]
+    )
+    paginator, page = paginate(request, author_post, count=count)
     context = {
         "page": page,
         "paginator": paginator,
+        "cache_version": page_version(f"author:{info['author'].pk}"),
     }
     context.update(info)
     return render(request, "profile.html", context)
@@ -95,10 +152,11 @@ def profile(request, username):
 def post_view(request, username, post_id):
     """ конкретная публикация. Ко всему прочему отображается форма комментария """
     info = profile_info(username, request.user)
-    post = info["author"].posts.get(pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(feed_queryset(info["author"].posts.all()), pk=post_id)
+    comments, comments_cursor = first_comments(post)
     context = {
         "comments": comments,
+        "comments_cursor": comments_cursor,
         "post": post,
         "form": CommentForm(),
     }
@@ -106,11 +164,25 @@ def post_view(request, username, post_id):
     return render(request, "post.html", context)
 
 
+def post_comments(request, username, post_id):
+    """ следующая порция комментариев поста HTML-фрагментом """
+    post = get_object_or_404(
+        Post.objects.select_related("author"), author__username=username, pk=post_id
+    )
+    page = comment_paginator(post).get_page(request.GET.get("cursor"))
+    context = {
+        "comments": page,
+        "comments_cursor": page.next_cursor,
+        "post": post,
+    }
+    return render(request, "includes/comment_list.html", context)
+
+
 @login_required
 def post_edit(request, username, post_id):
     """ Страница редактирования поста. Использует форму для создания поста. """
     info = profile_info(username, request.user)
-    post = info["author"].posts.get(pk=post_id)
+    post = get_object_or_404(feed_queryset(info["author"].posts.all()), pk=post_id)
     if request.user != post.author:
         context = {
             "post": post,
@@ -169,17 +241,18 @@ def delete_comment(request, comment_id, post_id):
 def comment_edit(request, comment_id, post_id):
     """ редактирование комментария """
     edit_comment = get_object_or_404(Comment, pk=comment_id)
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(feed_queryset(), pk=post_id)
     if edit_comment.author != request.user:
         return redirect("post", post.author, post.pk)
     if request.method != "POST":
         form = CommentForm(instance=edit_comment)
-        post_comments = post.comments.all()
+        comments, comments_cursor = first_comments(post)
         info = profile_info(post.author, request.user)
         context = {
             "form": form,
             "post": post,
-            "comments": post_comments,
+            "comments": comments,
+            "comments_cursor": comments_cursor,
             "edit_comment": edit_comment,
         }
         context.update(info)
@@ -195,15 +268,13 @@ def comment_edit(request, comment_id, post_id):
 @login_required
 def follow_index(request):
     """ страница избранных(подписанных) авторов """
-    # информация о текущем пользователе доступна в переменной request.user
-    author = Follow.objects.values("author").filter(user=request.user)
-    post = Post.objects.filter(author__in=author)
-    paginator = Paginator(post, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    post = feed_queryset(follow_feed(request.user))
+    count = feed_count("follow_index", post, ["posts", f"follow:{request.user.pk}"])
+    paginator, page = paginate(request, post, count=count)
     context = {
         "page": page,
         "paginator": paginator,
+        "cache_version": page_version("feed", f"follow:{request.user.pk}"),
     }
     return render(request, "follow.html", context)
 
@@ -216,10 +287,10 @@ def profile_follow(request, username):
     if author == user:
         return redirect("index")
 
-    if author.following.filter(user=request.user.id).exists():
+    # пара (user, author) уникальна: повторная подписка ничего не создаёт
+    _, created = Follow.objects.get_or_create(author=author, user=user)
+    if not created:
         return redirect("index")
-    follow = Follow.objects.create(author=author, user=user)
-    follow.save()
     messages.add_message(
         request, messages.SUCCESS, f"Вы подписались на автора {username}!"
     )
@@ -0,0 +1,64 @@
+"""
+Предварительная компиляция шаблонов проекта.
+
+С кэширующим загрузчиком каждый шаблон разбирается один раз на процесс,
+но это происходит на первом запросе, который его использует: первые
+ответы каждого воркера заметно медленнее остальных. warm_up при запуске
+разбирает все шаблоны проекта (каталоги DIRS и templates/ приложений
+проекта) и кладёт их в кэш загрузчика.
+"""
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.loaders.cached import Loader as CachedLoader
+
+
+logger = logging.getLogger(__name__)
+
+
+def template_dirs(engine):
+    """ каталоги шаблонов проекта; шаблоны сторонних приложений
+    (админка и прочие) загружаются по мере надобности """
+    dirs = list(engine.dirs)
+    for app_config in apps.get_app_configs():
+        path = os.path.join(app_config.path, "templates")
+        if app_config.path.startswith(settings.BASE_DIR) and os.path.isdir(path):
+            dirs.append(path)
+    return dirs
+
+
+def template_names(directory):
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.endswith((".html", ".txt")):
+                path = os.path.relpath(os.path.join(root, filename), directory)
+                yield path.replace(os.sep, "/")
+
+
+def uses_cached_loader(engine):
+    return any(isinstance(loader, CachedLoader) for loader in engine.template_loaders)
+
+
+def warm_up(engine=None):
+    """ компилирует шаблоны проекта в кэш загрузчика; возвращает число
+    шаблонов и затраченные секунды. Без кэширующего загрузчика делать
+    это незачем: шаблон всё равно будет разобран заново при рендеринге """
+    engine = engine or engines["django"].engine
+    if not uses_cached_loader(engine):
+        return 0, 0.0
+    started = time.perf_counter()
+    count = 0
+    for directory in template_dirs(engine):
+        for name in template_names(directory):
+            try:
+                engine.get_template(name)
+            except TemplateSyntaxError:
+                # сломанный шаблон пусть упадёт там, где его используют
+                logger.warning("Шаблон %s не скомпилирован", name, exc_info=True)
+                continue
+            count += 1
+    return count, time.perf_counter() - started
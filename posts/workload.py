@@ -0,0 +1,24 @@
+"""
+Общее для генератора синтетических данных (generate_data) и замеров
+лент (benchmark_feeds): популярность распределена по степенному закону,
+сгенерированные имена продолжают нумерацию уже существующих.
+"""
+import re
+from itertools import accumulate
+
+
+def power_law(count, alpha):
+    """ накопленные веса рангов 1..count по закону 1 / rank^alpha
+    для random.choices(cum_weights=...) """
+    return list(accumulate(1 / (rank ** alpha) for rank in range(1, count + 1)))
+
+
+def next_number(queryset, field, prefix):
+    """ номер, с которого продолжать имена вида prefix<число> в поле field:
+    на единицу больше наибольшего занятого. Число строк в таблице для
+    этого не годится: после удалений новые имена совпали бы со старыми """
+    names = queryset.filter(
+        **{f"{field}__regex": rf"^{re.escape(prefix)}[0-9]+$"}
+    ).values_list(field, flat=True)
+    numbers = (int(name[len(prefix):]) for name in names.iterator())
+    return max(numbers, default=-1) + 1
@@ -1,4 +1,22 @@
+import pytest
+from django.test.utils import override_settings
+
+from yatube.test_runner import isolated_caches
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """ загруженные в тестах картинки и их миниатюры не попадают в media/ """
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_cache(tmp_path_factory):
+    """ cache.clear() в тестах не трогает общий кэш сайта """
+    with override_settings(CACHES=isolated_caches(tmp_path_factory.mktemp("cache"))):
+        yield
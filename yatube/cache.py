@@ -0,0 +1,303 @@
+"""
+Общий для всех процессов кэш на SQLite.
+
+LocMemCache живёт внутри одного процесса: у каждого воркера gunicorn своя
+холодная копия, а сброс версий фрагментов до соседних воркеров не доходит.
+SQLiteCache хранит записи в одном файле в режиме WAL, поэтому его видят все
+процессы на машине без внешних сервисов. Записи вытесняются по давности
+обращения (приближённый LRU) при превышении MAX_ENTRIES или MAX_SIZE.
+"""
+import os
+import pickle
+import sqlite3
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_meta VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_meta SET entries = entries + 1, size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_meta SET entries = entries - 1, size = size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_resize AFTER UPDATE OF size ON cache BEGIN
+    UPDATE cache_meta SET size = size - OLD.size + NEW.size;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    size = excluded.size,
+    expires = excluded.expires,
+    accessed = excluded.accessed
+"""
+
+
+class SQLiteCache(BaseCache):
+    """
+    Бэкенд кэша django поверх файла SQLite.
+
+    OPTIONS:
+        MAX_ENTRIES, CULL_FREQUENCY — как у встроенных бэкендов;
+        MAX_SIZE — предел суммарного размера значений в байтах;
+        ACCESS_RESOLUTION — как часто (в секундах) обновлять время
+        обращения к записи: чтение не превращается в запись на каждый hit.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._max_size = int(options.get("MAX_SIZE", 64 * 1024 * 1024))
+        self._access_resolution = float(options.get("ACCESS_RESOLUTION", 30))
+        self._connection = None
+        self._pid = None
+
+    @property
+    def _db(self):
+        # после fork соединение родителя использовать нельзя
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def _write(self):
+        """ транзакция с блокировкой на запись сразу: атомарна между процессами """
+        return _Transaction(self._db)
+
+    def _load(self, row, now):
+        value, expires, accessed = row
+        if expires is not None and expires <= now:
+            return None
+        return pickle.loads(value)
+
+    def _touch_accessed(self, keys, now):
+        self._db.execute(
+            f"UPDATE cache SET accessed = ? WHERE accessed < ? AND key IN "
+            f"({','.join('?' * len(keys))})",
+            [now, now - self._access_resolution, *keys],
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        row = self._db.execute(
+            "SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        if row[1] is not None and row[1] <= now:
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return default
+        if row[2] < now - self._access_resolution:
+            self._touch_accessed([key], now)
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        now = time.time()
+        rows = self._db.execute(
+            f"SELECT key, value, expires, accessed FROM cache WHERE key IN "
+            f"({','.join('?' * len(made))})",
+            list(made),
+        ).fetchall()
+        result = {}
+        stale = []
+        for key, value, expires, accessed in rows:
+            if expires is not None and expires <= now:
+                continue
+            result[made[key]] = pickle.loads(value)
+            if accessed < now - self._access_resolution:
+                stale.append(key)
+        if stale:
+            self._touch_accessed(stale, now)
+        return result
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def _set(self, db, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        db.execute(
+            UPSERT,
+            (key, data, len(data), self.get_backend_timeout(timeout), time.time()),
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            self._set(db, key, value, timeout)
+            self._cull(db)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as db:
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._set(db, key, value, timeout)
+            self._cull(db)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            row = db.execute(
+                "SELECT expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (row[0] is None or row[0] > time.time()):
+                return False
+            self._set(db, key, value, timeout)
+            self._cull(db)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            updated = db.execute(
+                "UPDATE cache SET expires = ? WHERE key = ? "
+                "AND (expires IS NULL OR expires > ?)",
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount
+        return bool(updated)
+
+    def incr(self, key, delta=1, version=None):
+        """ атомарное приращение: чтение и запись в одной транзакции """
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            row = db.execute(
+                "SELECT value, expires, accessed FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            value = self._load(row, time.time()) if row is not None else None
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            value += delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                "UPDATE cache SET value = ?, size = ? WHERE key = ?",
+                (data, len(data), key),
+            )
+        return value
+
+    def incr_version(self, key, delta=1, version=None):
+        """ переносит запись на новую версию ключа одним UPDATE """
+        if version is None:
+            version = self.version
+        old_key = self.make_key(key, version)
+        new_key = self.make_key(key, version + delta)
+        self.validate_key(new_key)
+        with self._write() as db:
+            if not db.execute(
+                "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (old_key, time.time()),
+            ).fetchone():
+                raise ValueError(f"Key '{key}' not found")
+            db.execute("DELETE FROM cache WHERE key = ?", (new_key,))
+            db.execute("UPDATE cache SET key = ? WHERE key = ?", (new_key, old_key))
+        return version + delta
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        if not keys:
+            return
+        with self._write() as db:
+            db.execute(
+                f"DELETE FROM cache WHERE key IN ({','.join('?' * len(keys))})", keys
+            )
+
+    def clear(self):
+        with self._write() as db:
+            db.execute("DELETE FROM cache")
+
+    def _cull(self, db):
+        entries, size = db.execute(
+            "SELECT entries, size FROM cache_meta WHERE id = 1"
+        ).fetchone()
+        if entries <= self._max_entries and size <= self._max_size:
+            return
+        db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+        entries, size = db.execute(
+            "SELECT entries, size FROM cache_meta WHERE id = 1"
+        ).fetchone()
+        if entries > self._max_entries:
+            # как у встроенных бэкендов: убираем 1/CULL_FREQUENCY записей
+            count = entries // self._cull_frequency if self._cull_frequency else entries
+            db.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY accessed LIMIT ?)",
+                (max(count, entries - self._max_entries),),
+            )
+        if size > self._max_size:
+            excess = size - self._max_size
+            victims = []
+            for key, item_size in db.execute(
+                "SELECT key, size FROM cache ORDER BY accessed"
+            ):
+                if excess <= 0:
+                    break
+                victims.append(key)
+                excess -= item_size
+            db.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in victims])
+
+    def close(self, **kwargs):
+        # соединение переиспользуется между запросами этого процесса
+        pass
+
+
+class _Transaction:
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
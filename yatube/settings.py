@@ -37,7 +37,7 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = [
     'users',
-    'posts',
+    'posts.apps.PostsConfig',
     'django.contrib.sites',
     'django.contrib.flatpages',
     'django.contrib.admin',
@@ -53,7 +53,9 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'posts.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,12 +67,20 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+# Без DEBUG шаблоны разбираются один раз на процесс и хранятся в памяти
+# кэширующего загрузчика; при разработке правки видны без перезапуска
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -95,12 +105,24 @@ DATABASES = {
     }
 }
 
+# Общий для всех воркеров кэш в файле SQLite: версии фрагментов и их
+# сброс видны каждому процессу. Для разработки в одном процессе можно
+# вернуть 'django.core.cache.backends.locmem.LocMemCache'
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
 
+# Тесты очищают кэш (cache.clear()): раннер подставляет им свой
+# временный файл вместо общего кэша запущенного сайта
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -155,4 +177,68 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 #  подключаем движок filebased.EmailBackend
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 # указываем директорию, в которую будут складываться файлы писем
-EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
\ No newline at end of file
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
+
+# Лента подписок: авторы с большим числом подписчиков не раскладываются
+# по лентам при публикации, их посты подмешиваются при чтении
+POSTS_FANOUT_MAX_FOLLOWERS = 10000
+
+# Постраничная навигация лент: "offset" (номера страниц) или "cursor"
+# (keyset по дате публикации без OFFSET). В режиме курсора COUNT(*)
+# выполняется, только если включен POSTS_CURSOR_COUNT
+POSTS_PAGINATION_MODE = "offset"
+POSTS_CURSOR_COUNT = False
+
+# Как пагинатор лент узнаёт число записей (posts.counting): "exact",
+# "maintained", "cached" или "estimate" для каждой страницы. Оценка
+# планировщика меньше POSTS_COUNT_EXACT_BELOW строк заменяется точным числом
+POSTS_COUNT_STRATEGIES = {
+    "index": "cached",
+    "group_posts": "maintained",
+    "profile": "maintained",
+    "follow_index": "cached",
+}
+POSTS_COUNT_EXACT_BELOW = 10000
+
+# Сколько комментариев выводится на странице поста сразу и догружается
+# по кнопке "Показать ещё"
+POSTS_COMMENTS_PER_PAGE = 20
+
+# Время жизни фрагментов лент и карточек постов в кэше. Фрагменты
+# версионируются и сбрасываются сигналами при изменении данных
+POSTS_FRAGMENT_CACHE_TIMEOUT = 300
+
+# Сколько секунд браузер и обратный прокси могут отдавать анонимным
+# посетителям сохранённые страницы лент без перепроверки
+POSTS_ANONYMOUS_MAX_AGE = 60
+
+# Сколько живут целые страницы, сохранённые для анонимных читателей
+# (posts.middleware.AnonymousPageCacheMiddleware)
+POSTS_PAGE_CACHE_TIMEOUT = 300
+
+# Выборочное профилирование (posts.profiling): доля отбираемых запросов
+# и значение заголовка X-Profile, включающего замер конкретного запроса.
+# Если оба пустые, middleware отключается при запуске. Итоги процесса
+# сбрасываются в общий кэш раз в POSTS_PROFILING_FLUSH_INTERVAL секунд
+POSTS_PROFILING_SAMPLE_RATE = 0.0
+POSTS_PROFILING_TOKEN = ""
+POSTS_PROFILING_FLUSH_INTERVAL = 10
+
+# Компилировать все шаблоны проекта при запуске процесса (posts.warmup),
+# а не на первом использующем их запросе
+POSTS_TEMPLATE_WARMUP = not DEBUG
+
+# Миниатюры картинок постов делаются в пуле отдельных процессов после
+# сохранения формы; до готовности в карточке показывается заглушка
+POSTS_THUMBNAILS_ASYNC = True
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Загрузка картинок постов: больше POSTS_IMAGE_MAX_BYTES не принимаем,
+# остальное уменьшаем до POSTS_IMAGE_MAX_SIDE и пережимаем без EXIF
+POSTS_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POSTS_IMAGE_MAX_SIDE = 1920
+POSTS_IMAGE_MAX_PIXELS = 50_000_000
+POSTS_IMAGE_QUALITY = 85
+# Файл без ссылающихся постов не удаляется, если его записали или нашли
+# как дубликат новой загрузки меньше столько секунд назад
+POSTS_IMAGE_RELEASE_GRACE = 60
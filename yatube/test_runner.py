@@ -0,0 +1,33 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def isolated_caches(directory):
+    """ настройки CACHES, в которых файловые кэши лежат в directory """
+    caches = {}
+    for alias, params in settings.CACHES.items():
+        params = dict(params)
+        if params["BACKEND"] == "yatube.cache.SQLiteCache":
+            params["LOCATION"] = f"{directory}/{alias}.sqlite3"
+        caches[alias] = params
+    return caches
+
+
+class TestRunner(DiscoverRunner):
+    """ тесты работают со своим временным кэшем: cache.clear() в них не
+    должен стирать общий кэш запущенного сайта """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp(prefix="yatube-cache-")
+        self.caches = override_settings(CACHES=isolated_caches(self.cache_directory))
+        self.caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.disable()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
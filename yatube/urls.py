@@ -5,6 +5,8 @@ from django.contrib import admin
 from django.contrib.flatpages import views
 from django.urls import include, path
 
+from posts import profiling
+
 
 handler404 = "posts.views.page_not_found" # noqa
 handler500 = "posts.views.server_error"  # noqa
@@ -15,6 +17,10 @@ urlpatterns = [
     path('about/', include('django.contrib.flatpages.urls')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
+    path('api/v1/', include('posts.api_urls')),
+    path('debug/profiling/', profiling.stats_json, name='profiling'),
+    path('debug/profiling/metrics/', profiling.stats_prometheus, name='profiling_metrics'),
+    path('debug/profiling/templates/', profiling.stats_folded, name='profiling_templates'),
     path('', include('posts.urls')),
 ]
 